@@ -1,26 +1,46 @@
 '''
 LOGIC FOR CITPC CONNECTOR
     written by- Meyan Adhikari
+
+    python3 connect.py                  # log in once (skipped when we're already online)
+    python3 connect.py --force          # log in even if we seem to be online already
+    python3 connect.py --daemon         # stay running, log in again whenever the session drops
+    python3 connect.py --accounts accounts.txt --concurrency 8   # log in many accounts at once
 '''
 
-username = '080bel042' # your username 
-password = '2123-2470' # your password 
+username = '080bel042' # your username
+password = '2123-2470' # your password
 
-# REST LEAVE IT TO THE SCRIPT 
+# REST LEAVE IT TO THE SCRIPT
 
 login_url = 'https://10.100.1.1:8090/login.xml'
 
+# Daemon mode: a tiny request that only succeeds when we are really online
+# (the portal intercepts it otherwise), checked every PROBE_INTERVAL seconds
+probe_url = 'http://connectivitycheck.gstatic.com/generate_204'
+PROBE_INTERVAL = 60
+PROBE_TIMEOUT = 3
+LOGIN_TIMEOUT = 10
+BACKOFF_BASE = 5 # seconds to wait after the first failed login, doubled on every failure after that
+BACKOFF_MAX = 300
+CONCURRENCY = 8 # batch mode: logins in flight at the same time
+
+# Last successful login ("<username> <unix time>"), shared with connect.sh; while
+# it's younger than STATE_TTL seconds a plain run doesn't even probe the network
+STATE_FILE = '~/.citpc_state'
+STATE_TTL = 15 * 60
+
 
+import argparse
+import os
+import random
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-payload = {
-            'mode': '191',
-            'username': username,
-            'password': password,
-            'a': time.time()*1000, # unneccesary
-            'producttype': 'none'
-        }
+# Testing against mock_portal.py (or anything else) without editing the file
+login_url = os.environ.get('CITPC_LOGIN_URL', login_url)
+probe_url = os.environ.get('CITPC_PROBE_URL', probe_url)
 
 headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
@@ -28,14 +48,199 @@ headers = {
             'Referer': 'https://10.100.1.1:8090/'
         }
 
-try:
-    response = requests.post(login_url, data=payload, headers=headers, verify=False, timeout=10)
-    if response.status_code == 200:
-        if "You are signed in as" in response.text:
-            print("Congrats! The process is successfull, You are succesfully logged in !")
-        else:
-            print(response.text)
-            print("Hm! It seems like your credentials were wrong or in a non likely sceniaro you have reached your maximum login limit")
-
-except requests.exceptions.RequestException as e:
-    print(f'Unable to connect becuase of error {e}')
\ No newline at end of file
+
+def make_session():
+    # One session = one connection pool, so the daemon doesn't redo the TLS handshake every time
+    session = requests.Session()
+    session.headers.update(headers)
+    return session
+
+
+def attempt_login(session, user, secret):
+    '''POST the login form once; returns (result, seconds taken)
+
+    result is one of "ok", "wrong-credentials", "login-limit", "timeout", "error"
+    '''
+    payload = {
+                'mode': '191',
+                'username': user,
+                'password': secret,
+                'a': time.time()*1000, # unneccesary
+                'producttype': 'none'
+            }
+    started = time.perf_counter()
+    try:
+        # verify per request: a session-wide verify=False loses to REQUESTS_CA_BUNDLE in the environment
+        response = session.post(login_url, data=payload, timeout=LOGIN_TIMEOUT, verify=False)
+    except requests.exceptions.Timeout:
+        return "timeout", time.perf_counter() - started
+    except requests.exceptions.RequestException:
+        return "error", time.perf_counter() - started
+    elapsed = time.perf_counter() - started
+
+    if response.status_code != 200:
+        return "error", elapsed
+    if "You are signed in as" in response.text:
+        return "ok", elapsed
+    if "maximum login limit" in response.text.lower():
+        return "login-limit", elapsed
+    return "wrong-credentials", elapsed
+
+
+def read_state():
+    '''Seconds since the configured account last logged in, or None if unknown'''
+    try:
+        with open(os.path.expanduser(STATE_FILE)) as f:
+            user, logged_in_at = f.read().split()
+        if user == username:
+            return time.time() - float(logged_in_at)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def save_state():
+    path = os.path.expanduser(STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        f.write(f"{username} {int(time.time())}\n")
+    os.replace(path + '.tmp', path)
+
+
+def clear_state():
+    try:
+        os.remove(os.path.expanduser(STATE_FILE))
+    except OSError:
+        pass
+
+
+def login(session):
+    '''Log the configured account in, saying how it went; returns the attempt_login result'''
+    result, _ = attempt_login(session, username, password)
+    if result == "ok":
+        save_state()
+    else:
+        clear_state()
+    if result == "ok":
+        print("Congrats! The process is successfull, You are succesfully logged in !")
+    elif result == "login-limit":
+        print("Hm! You have reached your maximum login limit, log out somewhere else first")
+    elif result == "wrong-credentials":
+        print("Hm! It seems like your credentials were wrong")
+    else:
+        print(f'Unable to connect becuase of error: {result}')
+    return result
+
+
+def read_accounts(path):
+    '''One "username,password" per line; blank lines and # comments are skipped'''
+    accounts = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            user, sep, secret = line.partition(',')
+            if not sep or not user.strip():
+                raise SystemExit(f"{path}:{number}: expected username,password")
+            accounts.append((user.strip(), secret.strip()))
+    return accounts
+
+
+def login_all(accounts, concurrency):
+    '''Log every account in, at most `concurrency` at a time, and print a result table'''
+    def one(account):
+        # Sessions aren't shared between threads, each login gets its own
+        session = make_session()
+        try:
+            return attempt_login(session, *account)
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, accounts))
+    total = time.perf_counter() - started
+
+    width = max([len("account")] + [len(user) for user, _ in accounts])
+    print(f"{'account':<{width}}  {'result':<18} {'time':>7}")
+    counts = {}
+    for (user, _), (result, elapsed) in zip(accounts, results):
+        print(f"{user:<{width}}  {result:<18} {elapsed:>6.2f}s")
+        counts[result] = counts.get(result, 0) + 1
+    summary = ", ".join(f"{n} {result}" for result, n in sorted(counts.items()))
+    print(f"\n{len(accounts)} account(s) in {total:.2f}s with {concurrency} at a time: {summary}")
+    return results
+
+
+def is_online(session):
+    '''Cheap check: the probe only comes back as 204 when the portal lets us through'''
+    try:
+        response = session.get(probe_url, timeout=PROBE_TIMEOUT, allow_redirects=False, verify=False)
+        return response.status_code == 204
+    except requests.exceptions.RequestException:
+        return False
+
+
+def backoff_delay(failures):
+    # Exponential, with jitter so a whole lab doesn't retry in lockstep after a portal outage
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1))
+    return random.uniform(delay / 2, delay)
+
+
+def connect_once(force=False):
+    '''Log in unless we're already online, then say which path was taken and how long it took'''
+    started = time.perf_counter()
+    session = make_session()
+    if not force:
+        age = read_state()
+        if age is not None and age < STATE_TTL:
+            print(f"Logged in {age / 60:.0f} min ago, skipping the login (cached state, {time.perf_counter() - started:.3f}s)")
+            return "ok"
+        if is_online(session):
+            save_state()
+            print(f"Already online, skipping the login (connectivity probe, {time.perf_counter() - started:.3f}s)")
+            return "ok"
+    result = login(session)
+    print(f"(login POST, {time.perf_counter() - started:.3f}s)")
+    return result
+
+
+def run_daemon(session, interval):
+    print(f"Keeping {username} logged in, checking every {interval}s (Ctrl+C to stop)")
+    failures = 0
+    while True:
+        if is_online(session):
+            failures = 0
+            time.sleep(interval)
+            continue
+
+        print(time.strftime("[%H:%M:%S]"), "Session dropped, logging in again")
+        if login(session) == "ok":
+            failures = 0
+            time.sleep(interval)
+            continue
+
+        failures += 1
+        delay = backoff_delay(failures)
+        print(f"Login attempt {failures} failed, retrying in {delay:.0f}s")
+        time.sleep(delay)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Log in to the CITPC captive portal")
+    parser.add_argument("--daemon", action="store_true", help="keep running and log in again whenever the session drops")
+    parser.add_argument("--force", action="store_true", help="always send the login, even when we seem to be online")
+    parser.add_argument("--interval", type=int, default=PROBE_INTERVAL, help="seconds between connectivity checks in daemon mode")
+    parser.add_argument("--accounts", help="log in every username,password line of this file instead")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="logins at the same time with --accounts")
+    args = parser.parse_args()
+
+    if args.accounts:
+        login_all(read_accounts(args.accounts), max(1, args.concurrency))
+    elif args.daemon:
+        try:
+            run_daemon(make_session(), args.interval)
+        except KeyboardInterrupt:
+            print("Stopped")
+    else:
+        connect_once(args.force)
@@ -3,14 +3,51 @@
 # -----------------------------------
 # LOGIC FOR CITPC CONNECTOR
 # written by - Meyan Adhikari
+#
+#   ./connect.sh            log in (skipped when we're already online)
+#   ./connect.sh --force    log in even if we seem to be online already
 # -----------------------------------
 
 USERNAME="080bel042"
 PASSWORD="2123-2470"
 
-# NOW LEAVE 
+# NOW LEAVE
 
-LOGIN_URL="https://10.100.1.1:8090/login.xml"
+# CITPC_LOGIN_URL / CITPC_PROBE_URL point these elsewhere, e.g. at mock_portal.py
+LOGIN_URL="${CITPC_LOGIN_URL:-https://10.100.1.1:8090/login.xml}"
+
+# Only comes back as 204 when the portal isn't intercepting us
+PROBE_URL="${CITPC_PROBE_URL:-http://connectivitycheck.gstatic.com/generate_204}"
+
+# Last successful login ("<username> <unix time>"), shared with connect.py
+STATE_FILE="$HOME/.citpc_state"
+STATE_TTL=900
+
+START=$(date +%s%3N)
+elapsed() {
+    local ms=$(( $(date +%s%3N) - START ))
+    printf "%d.%03ds" $((ms / 1000)) $((ms % 1000))
+}
+
+if [ "$1" != "--force" ]; then
+    # Fast path 1: we logged in a moment ago, don't touch the network at all
+    if [ -f "$STATE_FILE" ]; then
+        read -r STATE_USER STATE_TIME < "$STATE_FILE"
+        AGE=$(( $(date +%s) - ${STATE_TIME:-0} ))
+        if [ "$STATE_USER" = "$USERNAME" ] && [ "$AGE" -lt "$STATE_TTL" ]; then
+            echo "Logged in $((AGE / 60)) min ago, skipping the login (cached state, $(elapsed))"
+            exit 0
+        fi
+    fi
+
+    # Fast path 2: already online, so a login would only use up one of our logins
+    PROBE=$(curl -s -o /dev/null -w "%{http_code}" --max-time 3 "$PROBE_URL")
+    if [ "$PROBE" = "204" ]; then
+        echo "$USERNAME $(date +%s)" > "$STATE_FILE"
+        echo "Already online, skipping the login (connectivity probe, $(elapsed))"
+        exit 0
+    fi
+fi
 
 TIMESTAMP=$(date +%s%3N)
 
@@ -25,8 +62,11 @@ RESPONSE=$(curl -sk --max-time 10 \
 )
 
 if echo "$RESPONSE" | grep -q "You are signed in as"; then
+    echo "$USERNAME $(date +%s)" > "$STATE_FILE"
     echo "Congrats! The process is successful, You are successfully logged in!"
 else
+    rm -f "$STATE_FILE"
     echo "$RESPONSE"
     echo "Hm! It seems like your credentials were wrong or you reached the maximum login limit."
 fi
+echo "(login POST, $(elapsed))"
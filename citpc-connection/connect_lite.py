@@ -0,0 +1,183 @@
+'''
+LEAN CITPC CONNECTOR FOR BOOT / CRON / NETWORK-UP HOOKS
+    written by- Meyan Adhikari
+
+Same login as connect.py, but only a socket + ssl and a request that's built
+byte for byte up front, so there's no requests/urllib3 (or even http.client)
+import to pay for on every boot and no InsecureRequestWarning noise. It does
+one thing: skip if we logged in recently, otherwise POST the form once and say
+how long each step took.
+
+    python3 connect_lite.py             # log in (skipped when logged in recently)
+    python3 connect_lite.py --force     # always send the login
+
+Exit status is 0 when logged in, 1 otherwise, so hooks can act on it.
+
+Targets (lab PCs / Termux, LAN to the portal): interpreter start + imports
+under 40 ms (`python3 -X importtime connect_lite.py`), whole run under 300 ms
+when the portal answers normally (`time python3 connect_lite.py --force`).
+'''
+
+username = '080bel042' # your username
+password = '2123-2470' # your password
+
+# REST LEAVE IT TO THE SCRIPT
+
+login_url = 'https://10.100.1.1:8090/login.xml'
+LOGIN_TIMEOUT = 10
+
+# Shared with connect.py and connect.sh ("<username> <unix time>")
+STATE_FILE = '~/.citpc_state'
+STATE_TTL = 15 * 60
+
+
+import os
+import socket
+import ssl
+import sys
+import time
+from urllib.parse import urlencode, urlsplit
+
+# Testing against mock_portal.py (or anything else) without editing the file
+login_url = os.environ.get('CITPC_LOGIN_URL', login_url)
+
+headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Referer': 'https://10.100.1.1:8090/'
+        }
+
+# Everything about the request is known up front, build it once
+_url = urlsplit(login_url)
+HOST = _url.hostname
+PORT = _url.port or (443 if _url.scheme == 'https' else 80)
+PATH = _url.path or '/'
+BODY = urlencode({
+            'mode': '191',
+            'username': username,
+            'password': password,
+            'a': int(time.time()*1000), # unneccesary
+            'producttype': 'none'
+        }).encode()
+REQUEST = (
+    f"POST {PATH} HTTP/1.1\r\n"
+    f"Host: {_url.netloc}\r\n"
+    + "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    + f"Content-Length: {len(BODY)}\r\n"
+    "Connection: close\r\n\r\n"
+).encode() + BODY
+
+
+def tls_context():
+    # The portal's certificate is self-signed, same as verify=False in connect.py
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def post_login():
+    '''POST the login form; returns (result, {phase: seconds})
+
+    result is one of "ok", "wrong-credentials", "login-limit", "timeout", "error"
+    '''
+    timings = {}
+    mark = time.perf_counter()
+
+    def lap(phase):
+        nonlocal mark
+        now = time.perf_counter()
+        timings[phase] = now - mark
+        mark = now
+
+    sock = None
+    try:
+        address = socket.getaddrinfo(HOST, PORT, type=socket.SOCK_STREAM)[0][4]
+        lap('dns')
+        sock = socket.create_connection(address[:2], timeout=LOGIN_TIMEOUT)
+        lap('connect')
+        if _url.scheme == 'https':
+            sock = tls_context().wrap_socket(sock, server_hostname=HOST)
+            lap('tls')
+        sock.sendall(REQUEST)
+        # Connection: close, so the portal ends the response by closing
+        chunks = []
+        while True:
+            try:
+                chunk = sock.recv(16384)
+            except ssl.SSLEOFError:
+                break  # closed without a TLS close_notify, the body is still complete
+            if not chunk:
+                break
+            chunks.append(chunk)
+        lap('response')
+    except socket.timeout:
+        return "timeout", timings
+    except OSError:
+        return "error", timings
+    finally:
+        if sock is not None:
+            sock.close()
+
+    raw = b"".join(chunks)
+    status_line = raw.split(b"\r\n", 1)[0].split()
+    if len(status_line) < 2 or status_line[1] != b"200":
+        return "error", timings
+    text = raw.decode('utf-8', 'replace')
+    if "You are signed in as" in text:
+        return "ok", timings
+    if "maximum login limit" in text.lower():
+        return "login-limit", timings
+    return "wrong-credentials", timings
+
+
+def read_state():
+    '''Seconds since the configured account last logged in, or None if unknown'''
+    try:
+        with open(os.path.expanduser(STATE_FILE)) as f:
+            user, logged_in_at = f.read().split()
+        if user == username:
+            return time.time() - float(logged_in_at)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def write_state(result):
+    path = os.path.expanduser(STATE_FILE)
+    try:
+        if result != "ok":
+            os.remove(path)
+            return
+        with open(path + '.tmp', 'w') as f:
+            f.write(f"{username} {int(time.time())}\n")
+        os.replace(path + '.tmp', path)
+    except OSError:
+        pass
+
+
+def main(argv):
+    started = time.perf_counter()
+    if '--force' not in argv:
+        age = read_state()
+        if age is not None and age < STATE_TTL:
+            print(f"Logged in {age / 60:.0f} min ago, skipping the login (cached state, {time.perf_counter() - started:.3f}s)")
+            return 0
+
+    result, timings = post_login()
+    write_state(result)
+    if result == "ok":
+        print("Congrats! The process is successfull, You are succesfully logged in !")
+    elif result == "login-limit":
+        print("Hm! You have reached your maximum login limit, log out somewhere else first")
+    elif result == "wrong-credentials":
+        print("Hm! It seems like your credentials were wrong")
+    else:
+        print(f'Unable to connect becuase of error: {result}')
+    phases = ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in timings.items())
+    print(f"({phases}{', ' if phases else ''}total {time.perf_counter() - started:.3f}s)")
+    return 0 if result == "ok" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,120 @@
+'''
+LOAD TEST FOR THE CITPC LOGIN
+    written by- Meyan Adhikari
+
+Fires N logins through connect.py's own login code, `concurrency` at a time,
+and reports throughput, latency percentiles and how each login ended. Meant to
+be run against mock_portal.py, never the real portal.
+
+    python3 mock_portal.py &
+    python3 loadtest.py -n 500 -c 50
+    python3 loadtest.py -n 200 -c 20 --mix ok=80,wrong-credentials=5,login-limit=5,slow=5,drop=5
+'''
+
+import argparse
+import random
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import connect
+
+DEFAULT_URL = 'https://localhost:8090/login.xml'
+
+# mock_portal.py decides what happens to a login by the username's prefix
+USERNAMES = {
+    "ok": "lt",
+    "wrong-credentials": "wrong",
+    "login-limit": "limit",
+    "slow": "slow",
+    "drop": "drop",
+}
+
+
+def parse_mix(text):
+    '''"ok=80,slow=20" -> {"ok": 80, "slow": 20}'''
+    mix = {}
+    for part in text.split(","):
+        scenario, _, weight = part.partition("=")
+        scenario = scenario.strip()
+        if scenario not in USERNAMES:
+            raise SystemExit(f"Unknown scenario {scenario!r}, pick from: {', '.join(USERNAMES)}")
+        try:
+            mix[scenario] = int(weight or 1)
+        except ValueError:
+            raise SystemExit(f"Bad weight in {part!r}")
+    return mix
+
+
+def make_accounts(count, mix):
+    scenarios = random.choices(list(mix), weights=list(mix.values()), k=count)
+    return [(f"{USERNAMES[scenario]}{i:05d}", "secret") for i, scenario in enumerate(scenarios)]
+
+
+def percentile(sorted_values, p):
+    '''Nearest-rank percentile of an already sorted list'''
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run(accounts, concurrency, reuse):
+    '''Returns [(result, seconds)] in account order and the wall time'''
+    local = threading.local()
+
+    def one(account):
+        if reuse:
+            # One session per worker thread, like the daemon keeping its pool warm
+            if not hasattr(local, "session"):
+                local.session = connect.make_session()
+            return connect.attempt_login(local.session, *account)
+        # Fresh session per login, like that many separate machines
+        session = connect.make_session()
+        try:
+            return connect.attempt_login(session, *account)
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, accounts))
+    return results, time.perf_counter() - started
+
+
+def report(results, wall, concurrency):
+    latencies = sorted(elapsed for _, elapsed in results)
+    print(f"{len(results)} login(s) in {wall:.2f}s with {concurrency} at a time: {len(results) / wall:.1f} logins/s")
+    print("latency  " + "  ".join(f"p{p} {percentile(latencies, p) * 1000:.0f}ms" for p in (50, 90, 99))
+          + f"  max {latencies[-1] * 1000:.0f}ms")
+
+    by_result = {}
+    for result, elapsed in results:
+        by_result.setdefault(result, []).append(elapsed)
+    print(f"\n{'result':<18} {'count':>6} {'share':>6} {'p50':>8} {'p99':>8}")
+    for result, times in sorted(by_result.items(), key=lambda item: -len(item[1])):
+        times.sort()
+        print(f"{result:<18} {len(times):>6} {len(times) / len(results):>6.1%} "
+              f"{percentile(times, 50) * 1000:>6.0f}ms {percentile(times, 99) * 1000:>6.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the login flow against mock_portal.py")
+    parser.add_argument("--url", default=DEFAULT_URL, help=f"login endpoint (default {DEFAULT_URL})")
+    parser.add_argument("-n", "--logins", type=int, default=200, help="how many logins in total")
+    parser.add_argument("-c", "--concurrency", type=int, default=connect.CONCURRENCY, help="logins in flight at the same time")
+    parser.add_argument("--mix", default="ok", help="scenario weights, e.g. ok=90,drop=10 (scenarios: %s)" % ", ".join(USERNAMES))
+    parser.add_argument("--timeout", type=float, default=connect.LOGIN_TIMEOUT, help="seconds before a login counts as a timeout")
+    parser.add_argument("--reuse", action="store_true", help="keep one session per worker instead of a new one per login")
+    args = parser.parse_args()
+
+    # Point connect.py at the mock instead of the real portal
+    connect.login_url = args.url
+    connect.LOGIN_TIMEOUT = args.timeout
+    # verify=False on every request, we know
+    warnings.filterwarnings("ignore", message="Unverified HTTPS request")
+
+    accounts = make_accounts(max(1, args.logins), parse_mix(args.mix))
+    results, wall = run(accounts, max(1, args.concurrency), args.reuse)
+    report(results, wall, max(1, args.concurrency))
@@ -0,0 +1,182 @@
+'''
+MOCK CITPC CAPTIVE PORTAL
+    written by- Meyan Adhikari
+
+A stand-in for https://10.100.1.1:8090/login.xml on localhost, so the
+connectors can be tested (and load tested) off the college network.
+
+    python3 mock_portal.py                          # https://localhost:8090/login.xml
+    python3 mock_portal.py --scenario slow --delay 15
+
+    CITPC_LOGIN_URL=https://localhost:8090/login.xml python3 connect.py --force
+
+What a login gets depends on the username (or --scenario for every login):
+
+    wrong...   wrong credentials page
+    limit...   maximum login limit page
+    slow...    signed in, but only after --delay seconds
+    drop...    connection closed without any response
+    anything else signs in
+
+GET /generate_204 answers 204 once somebody has signed in and redirects to the
+portal before that, like the real network does, so daemon mode can be pointed
+at it with CITPC_PROBE_URL.
+
+Needs the openssl command to make the self-signed certificate the first time
+(or pass your own with --cert/--key).
+'''
+
+import argparse
+import os
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+SCENARIOS = ("auto", "ok", "wrong-credentials", "login-limit", "slow", "drop")
+PREFIXES = {
+    "wrong": "wrong-credentials",
+    "limit": "login-limit",
+    "slow": "slow",
+    "drop": "drop",
+}
+
+RESPONSE = '''<?xml version='1.0' ?><requestresponse><status><![CDATA[{status}]]></status><message><![CDATA[{message}]]></message><logoutmessage><![CDATA[You have successfully logged off]]></logoutmessage><state><![CDATA[]]></state></requestresponse>'''
+MESSAGES = {
+    "ok": ("LIVE", "You are signed in as {username}"),
+    "wrong-credentials": ("LOGIN", "Login failed. Invalid user name/password. Please contact the administrator."),
+    "login-limit": ("LOGIN", "Login failed. You have reached the maximum login limit."),
+}
+
+
+def self_signed_cert():
+    '''(cert, key) paths, made with openssl once and kept in the temp directory'''
+    base = os.path.join(tempfile.gettempdir(), "citpc-mock")
+    cert, key = base + "-cert.pem", base + "-key.pem"
+    if not (os.path.exists(cert) and os.path.exists(key)):
+        try:
+            subprocess.run(
+                ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "365",
+                 "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+                check=True, capture_output=True
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise SystemExit(f"Couldn't make a self-signed certificate with openssl ({e}), pass --cert and --key")
+    return cert, key
+
+
+class PortalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/login.xml":
+            return self.reply(404, "Not found", "text/plain")
+
+        length = int(self.headers.get("Content-Length") or 0)
+        form = parse_qs(self.rfile.read(length).decode("utf-8", "replace"))
+        username = form.get("username", [""])[0]
+        scenario = self.server.pick_scenario(username, form.get("password", [""])[0])
+        self.server.count(scenario)
+
+        if scenario == "drop":
+            # Like the portal falling over mid-login: no status line, no body
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        if scenario == "slow":
+            time.sleep(self.server.delay)
+            scenario = "ok"
+        if scenario == "ok":
+            self.server.signed_in = True
+
+        status, message = MESSAGES[scenario]
+        self.reply(200, RESPONSE.format(status=status, message=message.format(username=username)), "text/xml")
+
+    def do_GET(self):
+        if self.path == "/generate_204":
+            if self.server.signed_in:
+                return self.reply(204, "", "text/plain")
+            self.send_response(302)
+            self.send_header("Location", "https://localhost:%d/" % self.server.server_address[1])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.reply(200, "<html><body>CITPC mock portal</body></html>", "text/html")
+
+    def reply(self, code, text, content_type):
+        body = text.encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class MockPortal(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256 # load tests open a lot of connections at once
+
+    def __init__(self, address, context, scenario="auto", delay=15.0, verbose=False):
+        super().__init__(address, PortalHandler)
+        self.context = context
+        self.scenario = scenario
+        self.delay = delay
+        self.verbose = verbose
+        self.signed_in = False
+        self.counts = {}
+        self.counts_lock = threading.Lock()
+
+    def finish_request(self, request, client_address):
+        # TLS handshake here, on the request's own thread, so one slow client
+        # can't hold up accept() for everybody else
+        try:
+            request = self.context.wrap_socket(request, server_side=True)
+        except (ssl.SSLError, OSError):
+            return
+        super().finish_request(request, client_address)
+
+    def pick_scenario(self, username, password):
+        if self.scenario != "auto":
+            return self.scenario
+        if not username or not password:
+            return "wrong-credentials"
+        for prefix, scenario in PREFIXES.items():
+            if username.startswith(prefix):
+                return scenario
+        return "ok"
+
+    def count(self, scenario):
+        with self.counts_lock:
+            self.counts[scenario] = self.counts.get(scenario, 0) + 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the CITPC captive portal")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="auto", help="answer every login this way instead of going by the username")
+    parser.add_argument("--delay", type=float, default=15.0, help="seconds a slow login takes (connect.py gives up after 10)")
+    parser.add_argument("--cert", help="PEM certificate (default: a self-signed one made with openssl)")
+    parser.add_argument("--key", help="PEM private key for --cert")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    cert, key = (args.cert, args.key) if args.cert else self_signed_cert()
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+
+    server = MockPortal((args.host, args.port), context, args.scenario, args.delay, args.verbose)
+    print(f"Mock portal on https://{args.host}:{args.port}/login.xml (scenario: {args.scenario}, Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        summary = ", ".join(f"{n} {scenario}" for scenario, n in sorted(server.counts.items()))
+        print(f"Stopped after {sum(server.counts.values())} login(s){': ' + summary if summary else ''}")
@@ -0,0 +1,284 @@
+'''
+OFFLINE BENCHMARK FOR THE ROUTINE BOT
+
+Drives the command handlers from bot.py through a stand-in ctx/channel (no
+Discord connection, no token) against seeded data sets and reports latency
+percentiles, memory allocations and bytes written per command.
+
+    python bench.py                       # 10, 1k and 100k seeded dates
+    python bench.py --sizes 10,1000 --iterations 50 --json results.json
+    STORAGE_BACKEND=sqlite python bench.py
+'''
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+# bot.py keeps its files relative to the working directory, so run in a scratch one
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+WORKDIR = tempfile.mkdtemp(prefix="routine-bench-")
+os.chdir(WORKDIR)
+
+import bot  # noqa: E402  (must come after the chdir)
+from storage import new_date_entry  # noqa: E402
+from timetable import compile_routines  # noqa: E402
+
+GUILD_ID = 4_000_000
+CHANNEL_ID = 99
+
+
+# ---------------- FAKE DISCORD OBJECTS ----------------
+class FakeMessage:
+    next_id = 1
+
+    def __init__(self, content, age_minutes, author=None):
+        self.id = FakeMessage.next_id
+        FakeMessage.next_id += 1
+        self.content = content
+        self.author = author
+        self.created_at = datetime.now(timezone.utc) - timedelta(minutes=age_minutes)
+
+    async def delete(self):
+        pass
+
+
+class FakeChannel:
+    """Enough of a TextChannel for the handlers: history, bulk delete and send"""
+
+    def __init__(self):
+        self.id = CHANNEL_ID
+        self.sent = 0
+
+    def __str__(self):
+        return "bench"
+
+    async def history(self, limit=100, after=None):
+        # A few command messages, then (when scanning back) the previous routine post
+        for i in range(min(limit, 6)):
+            yield FakeMessage("!cancel dsp", i, author="someone")
+        if after is None:
+            yield FakeMessage("@everyone", 60, author=bot.bot.user)
+
+    async def delete_messages(self, messages):
+        pass
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+        return FakeMessage(content, 0, author=bot.bot.user)
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeContext:
+    def __init__(self, guild_id, channel):
+        self.guild = FakeGuild(guild_id)
+        self.channel = channel
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+
+# ---------------- SEEDING ----------------
+def seed_entry(rng, subjects):
+    entry = new_date_entry()
+    roll = rng.random()
+    if roll < 0.05:
+        entry["is_holiday"] = True
+        entry["holiday_reason"] = "Seeded holiday"
+        return entry
+    entry["cancellations"] = rng.sample(subjects, k=rng.randint(0, 2))
+    if roll < 0.3:
+        entry["rescheduled"][rng.choice(subjects)] = ["14:00", "Seeded reschedule"]
+    if roll < 0.2:
+        entry["added"].append(["15:00-16:00", "Seeded extra class"])
+    if roll < 0.4:
+        entry["room"] = "D204"
+    if roll < 0.1:
+        entry["notice"] = "Seeded notice"
+    return entry
+
+def seed_partition(size, seed=1):
+    """Write `size` dates (ending today) as the partition's stored data, tomorrow left clean"""
+    rng = random.Random(seed)
+    subjects = sorted(bot.SEARCH_INDEX.subjects)
+    today = datetime.now()
+    data = {
+        (today - timedelta(days=i)).strftime("%Y-%m-%d"): seed_entry(rng, subjects)
+        for i in range(size)
+    }
+    data_dir = os.path.join(WORKDIR, f"seed-{size}-{bot.STORAGE_BACKEND}")
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, bot.STORAGE_FILE), 'w') as f:
+        json.dump(data, f)
+    return data_dir
+
+def every_day_routine():
+    """The winter timetable copied onto all seven days, so tomorrow always has classes"""
+    winter = bot.ROUTINES["winter"]
+    weekdays = ["sunday", "monday", "tuesday", "wednesday", "thursday", "friday"]
+    days = {day: winter[day] for day in weekdays}
+    days["saturday"] = winter["sunday"]
+    return days
+
+
+# ---------------- MEASURING ----------------
+def written_bytes():
+    """Bytes this process has passed to write() so far (Linux), else None"""
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def measure(name, run, reset, part, iterations):
+    """Time `run` over several iterations, then count allocations over a second pass"""
+    latencies = []
+    written = 0
+    for _ in range(iterations):
+        await reset()
+        before = written_bytes()
+        started = time.perf_counter()
+        await run()
+        latencies.append((time.perf_counter() - started) * 1000)
+        # Background writes belong to the command that caused them
+        await part.flush_data()
+        after = written_bytes()
+        if before is not None and after is not None:
+            written += after - before
+
+    # Allocation pass, kept separate because tracing slows everything down
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    for _ in range(min(iterations, 20)):
+        await reset()
+        await run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await part.flush_data()
+    gc.collect()
+
+    return {
+        "command": name,
+        "p50_ms": statistics.median(latencies),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies),
+        "peak_kib": peak / 1024,
+        "net_blocks": sys.getallocatedblocks() - blocks_before,
+        "bytes_per_op": written / iterations if written_bytes() is not None else None,
+    }
+
+async def bench_size(size, iterations):
+    data_dir = seed_partition(size)
+    # A guild per size, so SQLite rows from an earlier size don't leak in
+    guild_id = GUILD_ID + size
+    key = str(guild_id)
+    bot.partition_config[key] = {"routine": "bench", "data_dir": data_dir}
+
+    channel = FakeChannel()
+    ctx = FakeContext(guild_id, channel)
+
+    started = time.perf_counter()
+    part = await bot.get_partition(ctx)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    tomorrow = datetime.now() + timedelta(days=1)
+    tomorrow_str = tomorrow.strftime("%Y-%m-%d")
+    day_index = part.day_index(tomorrow)
+    first_slot = day_index.slots[0]
+    rng = random.Random(7)
+    dates = list(part.schedule_data)
+
+    async def nothing():
+        pass
+
+    async def clean_tomorrow():
+        part.get_date_data(tomorrow_str)["cancellations"].clear()
+        part.save_data(tomorrow_str)
+        await part.flush_data()
+
+    async def do_save():
+        date_str = rng.choice(dates)
+        part.get_date_data(date_str)["notice"] = f"bench {rng.random()}"
+        part.save_data(date_str)
+        await part.flush_data()
+
+    cases = [
+        ("routine", lambda: bot.routine(ctx), nothing),
+        ("test", lambda: bot.test(ctx), nothing),
+        ("cancel", lambda: bot.cancel(ctx, search_term=first_slot.subject), clean_tomorrow),
+        ("reschedule", lambda: bot.reschedule(ctx, first_slot.time.split("–")[0], "17:00"), nothing),
+        ("changes", lambda: bot.changes(ctx), nothing),
+        ("save_data", do_save, nothing),
+    ]
+
+    results = [{"command": "load", "p50_ms": load_ms}]
+    for name, run, reset in cases:
+        # The bot's console logging would otherwise show up as bytes written
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.append(await measure(name, run, reset, part, iterations))
+
+    bot.partitions.pop(key, None)
+    await part.close()
+    return results
+
+def print_table(size, results):
+    print(f"\n== {size} seeded dates ({bot.STORAGE_BACKEND}) ==")
+    print(f"{'command':<12}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'peak KiB':>10}{'net blks':>10}{'B/op':>10}")
+    for r in results:
+        if r["command"] == "load":
+            print(f"{'load':<12}{r['p50_ms']:>9.2f}")
+            continue
+        written = "-" if r["bytes_per_op"] is None else f"{r['bytes_per_op']:.0f}"
+        print(
+            f"{r['command']:<12}{r['p50_ms']:>9.3f}{r['p90_ms']:>9.3f}{r['p99_ms']:>9.3f}"
+            f"{r['max_ms']:>9.3f}{r['peak_kib']:>10.1f}{r['net_blocks']:>10}{written:>10}"
+        )
+
+async def main(args):
+    bot.ROUTINES["bench"] = every_day_routine()
+    bot.TIMETABLE.update(compile_routines({"bench": bot.ROUTINES["bench"]}))
+    # Keep every seeded date hot, otherwise most of them would be archived on load
+    bot.RETENTION_DAYS = 200_000
+
+    report = {}
+    for size in args.sizes:
+        results = await bench_size(size, args.iterations)
+        print_table(size, results)
+        report[size] = results
+
+    if args.json:
+        with open(os.path.join(HERE, args.json) if not os.path.isabs(args.json) else args.json, 'w') as f:
+            json.dump({"backend": bot.STORAGE_BACKEND, "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the routine bot's command handlers offline")
+    parser.add_argument("--sizes", default="10,1000,100000",
+                        type=lambda v: [int(x) for x in v.split(",")], help="seeded date counts")
+    parser.add_argument("--iterations", type=int, default=200, help="timed runs per command")
+    parser.add_argument("--json", help="also write the results to this file")
+    asyncio.run(main(parser.parse_args()))
+    print(f"\n(scratch data in {WORKDIR})")
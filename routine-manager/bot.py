@@ -1,595 +1,1607 @@
 from dotenv import load_dotenv
 import os
-from discord.ext import commands
-from datetime import datetime, timedelta
+from discord.ext import commands, tasks
+from discord import app_commands
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 import discord
+import asyncio
+import copy
 import json
+import re
+import logging
+import signal
+import threading
+import time
+from storage import JsonStore, SqliteStore, new_date_entry
+from calendar_feed import build_calendar, date_events, write_feeds
+from telemetry import Telemetry
+from timetable import (
+    BREAK_SUBJECTS, TimetableError, class_interval, effective_schedule, find_clashes, find_slot,
+    load_timetable, parse_time_range, timetable_files
+)
 
 load_dotenv()
 TOKEN = os.getenv("TOKEN")
 
-DEFAULT_ROOM = "C303"
-CURRENT_SEASON = "winter"
+# Weekly timetables, one JSON file per season (see timetable.py); edits are
+# picked up every TIMETABLE_POLL seconds without a restart
+TIMETABLE_DIR = os.getenv("TIMETABLE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "timetables"))
+TIMETABLE_POLL = int(os.getenv("TIMETABLE_POLL", "30"))
+CURRENT_SEASON = os.getenv("ROUTINE_SEASON", "winter")
+DEFAULT_ROOM = "C303"  # when neither the partition nor its timetable names a room
 
-intents = discord.Intents.default()
-intents.message_content = True
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-# Persistent storage file
+# Persistent storage (see storage.py): "json" keeps a snapshot plus an append-only
+# journal of per-date changes, "sqlite" keeps rows in a WAL-mode database
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
 STORAGE_FILE = "routine_data.json"
+JOURNAL_FILE = "routine_data.journal"
+META_FILE = "routine_meta.json"
+SQLITE_FILE = "routine_data.db"
+COMPACT_EVERY = 200  # journal records before they get folded into the snapshot
+FLUSH_DELAY = 2.0  # seconds to collect changes before writing them out
+LIVE_EDIT_DELAY = 5.0  # quiet seconds after a change before a live post is edited
+LIVE_EDIT_MAX_WAIT = 30.0  # ...but a steady stream of changes still gets shown this often
 
-# State management - will be loaded from file
-schedule_data = {}  # {date_str: {cancellations, rescheduled, added, room, notice, is_holiday}}
-
-# ---------------- ROUTINE DATA ----------------
-ROUTINES = {
-    "winter": {
-        "sunday": {
-            "theory": [
-                ("10:15–11:45", "Digital Signal Processing (SPP)"),
-                ("11:45–13:15", "Project Engineering & Management (NG)"),
-                ("13:15–14:00", "Break"),
-                ("13:35–14:25", "Project Engineering & Management (NG)"),
-                ("14:25–15:15", "DSP Application (GGT)")
-            ],
-            "practical": {
-                "A": [("15:15–16:55", "Power Electronics Lab (SA+RS)")],
-                "B": []
-            }
-        },
-        "monday": {
-            "theory": [
-                ("10:15–11:05", "Switchgear & Protection (Akhm)"),
-                ("11:05–11:55", "Electric Machine Design (SKR)"),
-                ("12:45–14:25", "Engineering Thermodynamics & Heat Transfer (LM)"),
-                ("14:25–15:15", "Digital Control System (AD)")
-            ],
-            "practical": {}
-        },
-        "tuesday": {
-            "theory": [
-                ("10:15–11:05", "Switchgear & Protection (Akhm)"),
-                ("11:05–12:45", "Digital Control System (AD)")
-            ],
-            "practical": {
-                "A": [("13:35–15:15", "Electric Machine Design A/B (SKR+C)")],
-                "B": [("13:35–15:15", "Switchgear & Protection A/B (GDJ+BS)")]
-            }
-        },
-        "wednesday": {
-            "theory": [
-                ("10:15–11:05", "Engineering Thermodynamics & Heat Transfer (LM)"),
-                ("11:05–11:55", "Power Electronics (SA)"),
-                ("12:45–13:35", "Digital Signal Processing (SPP)")
-            ],
-            "practical": {
-                "A": [("13:35–15:15", "DSP Application (SPP)")],
-                "B": [("13:35–15:15", "Electric Machine Design A/B (SKR+C)")]
-            }
-        },
-        "thursday": {
-            "theory": [
-                ("10:15–11:05", "Electric Machine Design (SKR)"),
-                ("11:05–12:45", "DSP Application (SPP)"),
-                ("13:35–14:25", "Switchgear & Protection (Akhm)")
-            ],
-            "practical": {}
-        },
-        "friday": {
-            "theory": [
-                ("10:15–11:05", "Digital Control System (AD)"),
-                ("12:45–13:35", "Power Electronics (SA)"),
-                ("13:35–14:25", "Project Engineering & Management (NG)")
-            ],
-            "practical": {}
-        }
+# Past dates are kept in the hot data for this many days, then only read on demand
+ARCHIVE_DIR = "archive"
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "14"))
+
+# Every guild gets its own partition of routine state, stored under DATA_DIR.
+# PARTITIONS_FILE can give a guild ("<guild_id>") or a single section channel
+# ("<guild_id>:<channel_id>") its own settings:
+#   {"routine": "<timetable name>", "room": "C303", "data_dir": "."}
+# ("data_dir": "." keeps using the routine_data.json next to the bot)
+# Adding "autopost": {"time": "18:00", "channel": <channel_id>} posts tomorrow's
+# routine there every day ("channel" defaults to the section's own channel)
+# Adding "live": true edits the last routine post in place whenever its date's
+# overrides change, instead of everyone rerunning !routine (and pinging again)
+# Data from before partitions (routine_data.json & co. next to the bot) stays
+# where it is until a partition claims it: "legacy": true moves it into that
+# partition's data_dir, "data_dir": "." keeps using it in place
+PARTITIONS_FILE = "partitions.json"
+DATA_DIR = "data"
+PARTITION_IDLE_TTL = 30 * 60  # seconds before an idle partition is flushed and dropped from memory
+
+AUTOPOST_LEAD = timedelta(minutes=5)  # how early the auto-post is pre-rendered
+
+# Optional Prometheus text-format export of the !stats numbers
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_INTERVAL = int(os.getenv("METRICS_INTERVAL", "60"))  # seconds
+
+# Optional iCalendar export (see calendar_feed.py): one .ics file per partition
+# and practical group in ICS_DIR, refreshed whenever the partition's changes are written
+ICS_DIR = os.getenv("ICS_DIR")
+ICS_DAYS = int(os.getenv("ICS_DAYS", "120"))  # days ahead each feed covers
+ICS_PAST_DAYS = int(os.getenv("ICS_PAST_DAYS", "7"))
+
+# How far back !routine looks for its previous post when it has no record of
+# it (first run, or a post from before posts were tracked), and the most
+# messages one cleanup looks through after a tracked post. Only the bot's own
+# replies and command messages among them are deleted.
+CLEANUP_SCAN_LIMIT = int(os.getenv("CLEANUP_SCAN_LIMIT", "50"))
+CLEANUP_MAX = int(os.getenv("CLEANUP_MAX", "500"))
+
+partition_config = {}  # loaded from PARTITIONS_FILE at startup
+partitions = {}  # {partition key: Partition}, only the ones in use
+telemetry = Telemetry()
+autopost_done = {}  # {partition key: date_str already auto-posted for}
+
+# ---------------- TIMETABLES ----------------
+# Rebuilt together by install_timetables, so a handler never sees half a reload
+TIMETABLES = {}  # {season: Timetable}
+ROUTINES = {}  # {season: {weekday: {"theory": ..., "practical": ...}}}
+TIMETABLE = {}  # {(season, weekday): DayIndex}
+timetable_generation = 0  # bumped on every swap; part of the render cache key
+timetable_mtimes = {}  # {path: mtime} as of the last scan
+
+def load_timetables(previous):
+    """Load the timetable files, reusing unchanged ones; a file that fails keeps its previous version"""
+    timetables = {}
+    for path, mtime in timetable_files(TIMETABLE_DIR).items():
+        season = os.path.splitext(os.path.basename(path))[0]
+        old = previous.get(season)
+        if old and old.path == path and old.mtime == mtime:
+            timetables[season] = old
+            continue
+        try:
+            timetable = load_timetable(path)
+        except TimetableError as e:
+            print(f"❌ Rejected {path}: {e}")
+            if old:
+                print(f"   Still using {season} v{old.version}")
+                timetables[season] = old
+            continue
+        print(f"📅 Loaded {season} timetable v{timetable.version} from {path}")
+        for warning in timetable.warnings:
+            print(f"⚠️ [{season}] {warning}")
+        timetables[season] = timetable
+    return timetables
+
+def install_timetables(timetables):
+    """Swap in a new set of timetables, with the lookup tables built from them"""
+    global TIMETABLES, ROUTINES, TIMETABLE, SEARCH_INDEX, timetable_generation
+    routines = {season: timetable.routine for season, timetable in timetables.items()}
+    compiled = {
+        (season, weekday): day_index
+        for season, timetable in timetables.items()
+        for weekday, day_index in timetable.days.items()
     }
-}
+    search = build_search_index(routines)
+    TIMETABLES, ROUTINES, TIMETABLE, SEARCH_INDEX = timetables, routines, compiled, search
+    timetable_generation += 1
 
-# ---------------- STORAGE FUNCTIONS ----------------
-def load_data():
-    """Load schedule data from file"""
-    global schedule_data
-    try:
-        if os.path.exists(STORAGE_FILE):
-            with open(STORAGE_FILE, 'r') as f:
-                schedule_data = json.load(f)
-        else:
-            schedule_data = {}
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        schedule_data = {}
+    for part in partitions.values():
+        if part.season not in ROUTINES:
+            print(f"[{part.key}] Routine '{part.season}' is gone, using '{CURRENT_SEASON}'")
+            part.season = CURRENT_SEASON
+
+@tasks.loop(seconds=TIMETABLE_POLL)
+async def reload_timetables():
+    """Hot-swap edited, added or removed timetable files"""
+    global timetable_mtimes
+    files = timetable_files(TIMETABLE_DIR)
+    if files == timetable_mtimes:
+        return
+    timetable_mtimes = files
+    timetables = load_timetables(TIMETABLES)
+    if CURRENT_SEASON not in timetables:
+        print(f"❌ No usable '{CURRENT_SEASON}' timetable in {TIMETABLE_DIR}, keeping the current set")
+        return
+    if timetables != TIMETABLES:
+        install_timetables(timetables)
+
+class TimeArg(commands.Converter):
+    """Rejects malformed "HH:MM" / "HH:MM-HH:MM" arguments before the command runs"""
+    async def convert(self, ctx, argument):
+        try:
+            parse_time_range(argument)
+        except ValueError as e:
+            raise commands.BadArgument(f"❌ {e}. Use HH:MM or HH:MM-HH:MM (e.g. 10:15 or 14:00-15:00)")
+        return argument.strip()
+
+def describe_clashes(clashes):
+    """"**Subject** (10:15–11:05, Group A), ..." for a conflict reply"""
+    return ", ".join(
+        f"**{b.subject}** ({b.time}" + (f", Group {b.group}" if b.group else "") + ")"
+        for b in clashes
+    )
+
+# ---------------- SUBJECT SEARCH ----------------
+# Key scores: the best-matching key of each query word counts towards a subject
+SCORE_NAME, SCORE_ACRONYM, SCORE_CODE, SCORE_WORD, SCORE_PREFIX, SCORE_TRIGRAM = 100, 90, 80, 60, 40, 30
+AUTO_PICK_RATIO = 1.5  # the top match is picked when it beats the runner-up by this much
+ACRONYM_SKIP = {"and", "of", "the", "a", "b"}
+
+def search_words(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class SubjectSearch:
+    """Lookup table from names, acronyms, teacher codes, prefixes and trigrams to subjects"""
+
+    def __init__(self):
+        self.subjects = set()
+        self.keys = {}  # {key: {subject: score}}; trigram keys are stored as "#abc"
+
+    def _key(self, key, subject, score):
+        hits = self.keys.setdefault(key, {})
+        hits[subject] = max(score, hits.get(subject, 0))
 
-def save_data():
-    """Save schedule data to file"""
+    def add(self, subject):
+        """Index a subject such as "Digital Signal Processing (SPP)" (no-op if already indexed)"""
+        if subject in self.subjects:
+            return
+        self.subjects.add(subject)
+
+        name, _, codes = subject.partition("(")
+        words = search_words(name)
+        self._key(" ".join(words), subject, SCORE_NAME)
+
+        initials = "".join(w[0] for w in words if w not in ACRONYM_SKIP)
+        if len(initials) >= 2:
+            self._key(initials, subject, SCORE_ACRONYM)
+
+        # Teacher initials like SKR in "(SKR+C)"; single letters are too ambiguous
+        for code in search_words(codes):
+            if len(code) >= 2:
+                self._key(code, subject, SCORE_CODE)
+
+        for word in words:
+            self._key(word, subject, SCORE_WORD)
+            for end in range(2, len(word)):
+                self._key(word[:end], subject, SCORE_PREFIX)
+            for gram in trigrams(word):
+                self._key("#" + gram, subject, 1)
+
+    def search(self, query, candidates):
+        """Rank candidate subjects for a query as [(subject, score)], best first"""
+        candidates = set(candidates)
+        scores = {}
+        words = search_words(query)
+
+        # A multi-word query can also be a subject's full name
+        if len(words) > 1:
+            for subject, score in self.keys.get(" ".join(words), {}).items():
+                scores[subject] = score
+
+        for word in words:
+            hits = self.keys.get(word)
+            if hits is None and len(word) >= 3:
+                # Not a known word, prefix or code: score by shared trigrams (typos, word middles)
+                grams = trigrams(word)
+                counts = {}
+                for gram in grams:
+                    for subject in self.keys.get("#" + gram, ()):
+                        counts[subject] = counts.get(subject, 0) + 1
+                hits = {subject: SCORE_TRIGRAM * n / len(grams) for subject, n in counts.items() if n * 2 >= len(grams)}
+            for subject, score in (hits or {}).items():
+                scores[subject] = scores.get(subject, 0) + score
+
+        ranked = [(subject, score) for subject, score in scores.items() if subject in candidates]
+        ranked.sort(key=lambda item: -item[1])
+        return ranked
+
+def pick_match(ranked, query):
+    """The single subject a search clearly points at, or None if it's ambiguous
+
+    These searches cancel things, so a tie at the ratio isn't a clear win, and
+    neither is beating a runner-up that literally contains every word of the query.
+    """
+    if not ranked:
+        return None
+    if len(ranked) == 1:
+        return ranked[0][0]
+    if set(search_words(query)) <= set(search_words(ranked[1][0])):
+        return None
+    if ranked[0][1] > AUTO_PICK_RATIO * ranked[1][1]:
+        return ranked[0][0]
+    return None
+
+def exact_match(query, candidates):
+    """The candidate whose full name is the query (ignoring case), or None"""
+    query = query.strip().lower()
+    return next((subject for subject in candidates if subject.lower() == query), None)
+
+def build_search_index(routines):
+    index = SubjectSearch()
+    for days in routines.values():
+        for routine_data in days.values():
+            for _, subject in routine_data["theory"]:
+                index.add(subject)
+            for classes in routine_data["practical"].values():
+                for _, subject in classes:
+                    index.add(subject)
+    return index
+
+SEARCH_INDEX = SubjectSearch()
+
+# The timetables have to be there before anything else can run
+timetable_mtimes = timetable_files(TIMETABLE_DIR)
+install_timetables(load_timetables({}))
+if CURRENT_SEASON not in ROUTINES:
+    raise SystemExit(f"No usable '{CURRENT_SEASON}' timetable in {TIMETABLE_DIR}")
+
+# ---------------- PARTITIONS ----------------
+def tomorrow_date():
+    """The date the single-day commands work on"""
+    return datetime.now() + timedelta(days=1)
+
+def retention_cutoff():
+    """Dates before this one belong in the archive rather than the hot data"""
+    return (datetime.now() - timedelta(days=RETENTION_DAYS)).strftime("%Y-%m-%d")
+
+def load_partition_config():
+    """Read PARTITIONS_FILE, if there is one"""
+    global partition_config
     try:
-        with open(STORAGE_FILE, 'w') as f:
-            json.dump(schedule_data, f, indent=2)
+        if os.path.exists(PARTITIONS_FILE):
+            with open(PARTITIONS_FILE, 'r') as f:
+                partition_config = json.load(f)
     except Exception as e:
-        print(f"Error saving data: {e}")
-
-def get_tomorrow_data():
-    """Get or create data for tomorrow"""
-    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-    if tomorrow not in schedule_data:
-        schedule_data[tomorrow] = {
-            "cancellations": [],
-            "rescheduled": {},
-            "added": [],
-            "room": None,
-            "notice": None,
-            "is_holiday": False,
-            "holiday_reason": None
-        }
-    return tomorrow, schedule_data[tomorrow]
-
-def get_date_data(date_str):
-    """Get data for specific date"""
-    if date_str not in schedule_data:
-        schedule_data[date_str] = {
-            "cancellations": [],
-            "rescheduled": {},
-            "added": [],
-            "room": None,
-            "notice": None,
-            "is_holiday": False,
-            "holiday_reason": None
+        print(f"Error loading partitions: {e}")
+
+    for key, config in partition_config.items():
+        if config.get("autopost") and autopost_time(config) is None:
+            print(f"[{key}] Invalid autopost time {config['autopost'].get('time')!r}, expected HH:MM")
+        if config.get("autopost") and ":" not in key and not config["autopost"].get("channel"):
+            # Only a section partition has a channel of its own to fall back on
+            print(f'[{key}] Autopost needs a "channel" for a whole guild, not auto-posting')
+            del config["autopost"]
+
+    if legacy_data_files() and not legacy_data_in_use():
+        print(f"⚠️ Found routine data from before partitions ({', '.join(legacy_data_files())}) that no partition uses. "
+              f'Give the guild it belongs to "legacy": true (move it into its data_dir) or "data_dir": "." '
+              f"(keep it in place) in {PARTITIONS_FILE}.")
+
+legacy_lock = threading.Lock()  # partitions load on their own workers
+
+def legacy_data_files():
+    """The pre-partition data files/dirs that still exist next to the bot"""
+    return [name for name in (STORAGE_FILE, JOURNAL_FILE, META_FILE, ARCHIVE_DIR) if os.path.exists(name)]
+
+def legacy_data_in_use():
+    return any(os.path.abspath(config.get("data_dir", DATA_DIR)) == os.path.abspath(".")
+               for config in partition_config.values())
+
+def adopt_legacy_data(key, data_dir):
+    """Move the pre-partition data into the data_dir of the partition that claimed it, if it has none of its own yet"""
+    with legacy_lock:
+        legacy = legacy_data_files()
+        if not legacy or legacy_data_in_use():
+            return
+        if any(os.path.exists(os.path.join(data_dir, name)) for name in (STORAGE_FILE, JOURNAL_FILE)):
+            print(f"⚠️ [{key}] Not moving the old routine data ({', '.join(legacy)}): this guild already has its own")
+            return
+        os.makedirs(data_dir, exist_ok=True)
+        for name in legacy:
+            os.replace(name, os.path.join(data_dir, name))
+        print(f"📦 [{key}] Moved the old routine data ({', '.join(legacy)}) into {data_dir}")
+
+def partition_key(guild_id, channel_id):
+    """A channel configured as its own section gets its own partition, otherwise the guild shares one"""
+    if guild_id is None:
+        return f"dm-{channel_id}"
+    if f"{guild_id}:{channel_id}" in partition_config:
+        return f"{guild_id}:{channel_id}"
+    return str(guild_id)
+
+async def get_partition(ctx):
+    """The loaded partition a command's guild/channel belongs to"""
+    return await load_partition(partition_key(ctx.guild.id if ctx.guild else None, ctx.channel.id))
+
+async def load_partition(key):
+    """The partition for a key, loading it first if it isn't in memory"""
+    part = partitions.get(key)
+    if part is None:
+        part = partitions[key] = Partition(key, partition_config.get(key, {}))
+    await part.ensure_loaded()
+    part.last_used = time.monotonic()
+    return part
+
+
+class Partition:
+    """Routine state of one guild or section: its timetable, room and date overrides"""
+
+    def __init__(self, key, config):
+        self.key = key
+        self.season = config.get("routine", CURRENT_SEASON)
+        if self.season not in ROUTINES:
+            print(f"[{key}] Unknown routine '{self.season}', using '{CURRENT_SEASON}'")
+            self.season = CURRENT_SEASON
+        self.room = config.get("room")  # overrides the timetable's room
+        self.live = bool(config.get("live"))  # edit the routine post in place on changes
+        self.data_dir = config.get("data_dir", os.path.join(DATA_DIR, key.replace(":", "_")))
+        self.legacy = bool(config.get("legacy"))  # takes over the data from before partitions
+        self.store = None
+        self.schedule_data = {}  # {date_str: {cancellations, rescheduled, added, room, notice, is_holiday}}
+        self.archived = {}  # {date_str: entry or None} read ahead from the archive by prefetch_archived
+        self.loaded = False
+        self.load_lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+        # Each partition writes on its own single worker: ordered, off the event
+        # loop, and never queued behind another server's writes
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"persist-{key}")
+        self.flush_lock = asyncio.Lock()
+        self.flush_task = None
+        self.dirty_dates = set()
+
+        # Every mutation bumps its date's version so cached renders can be reused safely
+        self.change_version = 0
+        self.data_versions = {}  # {date_str: change_version at last mutation}
+        self.render_cache = {}  # {date_str: ((season, timetable generation, version), rendered view)}
+        self.prepared_post = None  # (date_str, version, content, embed) ready for the auto-post
+        self.rooms_cache = None  # (change_version, rooms used so far) for room autocomplete
+        self.schedule_cache = {}  # {date_str: (render key, DaySchedule)}
+        self.feed_cache = {}  # {(feed, date_str): (render key, VEVENT text)}
+        self.feed_windows = {}  # {feed path: (first date, day count)} when it was last written
+        self.routine_posts = {}  # {channel id: [message id, date it shows]} of the last routine post there, kept in the store's meta
+        self.live_shown = {}  # {channel id: (content, embed dict)} the live post was last sent/edited with
+        self.live_pending = set()  # dates whose live posts need another look
+        self.live_task = None
+
+    async def run(self, func, *args):
+        """Run blocking storage work on this partition's worker"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    # ---- loading ----
+    def open_store(self):
+        """Create the configured backend, importing the JSON data into SQLite the first time"""
+        if self.legacy:
+            adopt_legacy_data(self.key, self.data_dir)
+        os.makedirs(self.data_dir, exist_ok=True)
+        json_store = JsonStore(
+            os.path.join(self.data_dir, STORAGE_FILE),
+            os.path.join(self.data_dir, JOURNAL_FILE),
+            os.path.join(self.data_dir, ARCHIVE_DIR),
+            os.path.join(self.data_dir, META_FILE),
+            COMPACT_EVERY
+        )
+        if STORAGE_BACKEND != "sqlite":
+            return json_store
+        sqlite_store = SqliteStore(SQLITE_FILE, guild=self.key)
+        # A store that was never compacted has everything in its journal
+        json_files = (json_store.storage_file, json_store.journal_file, json_store.archive_dir)
+        if not sqlite_store.get_meta("imported") and any(os.path.exists(p) for p in json_files):
+            count = sqlite_store.import_from(json_store)
+            print(f"📥 Imported {count} date(s) from {self.data_dir} into {SQLITE_FILE}")
+        return sqlite_store
+
+    def _load(self):
+        started = time.perf_counter()
+        self.store = self.open_store()
+        self.schedule_data = self.store.load(retention_cutoff())
+        # Older meta stored a bare message ID per channel, without the date it shows
+        self.routine_posts = {
+            channel_id: post if isinstance(post, list) else [post, None]
+            for channel_id, post in self.store.get_meta("routine_posts", {}).items()
         }
-    return schedule_data[date_str]
+        telemetry.loads.observe((time.perf_counter() - started) * 1000)
 
-# ---------------- EVENTS ----------------
-@bot.event
-async def on_ready():
-    load_data()
-    print(f"✅ Logged in as {bot.user}")
+    async def ensure_loaded(self):
+        """Load this partition's data the first time it's needed"""
+        async with self.load_lock:
+            if self.loaded:
+                return
+            await self.run(self._load)
+            self.loaded = True
+            archived = await self.archive_old_dates()
+            if archived:
+                print(f"📦 [{self.key}] Archived {archived} past date(s)")
+            if ICS_DIR:
+                asyncio.get_running_loop().create_task(self.export_calendars())
+
+    # ---- saving ----
+    def _write_changes(self, changes, snapshot):
+        """Persist changed dates, then compact if asked to (runs on the worker)"""
+        started = time.perf_counter()
+        self.store.write(changes)
+        if snapshot is not None:
+            self.store.compact(snapshot)
+        return (time.perf_counter() - started) * 1000, self.store.size_bytes()
+
+    async def flush_data(self, compact=False):
+        """Write every pending change out now, in the background executor"""
+        async with self.flush_lock:
+            if not self.dirty_dates and not compact:
+                return
+            # Copy on the loop so handlers can keep mutating while the worker writes
+            changes = {d: copy.deepcopy(self.schedule_data.get(d)) for d in sorted(self.dirty_dates)}
+            self.dirty_dates.clear()
+
+            snapshot = None
+            if compact or self.store.should_compact(len(changes)):
+                snapshot = copy.deepcopy(self.schedule_data)
+
+            try:
+                elapsed_ms, size = await self.run(self._write_changes, changes, snapshot)
+                telemetry.observe_flush(self.key, elapsed_ms, size)
+            except Exception as e:
+                print(f"[{self.key}] Error saving data: {e}")
+                # Keep them pending so the next flush retries
+                self.dirty_dates.update(changes)
+
+    async def _flush_later(self):
+        """Coalesce bursts of changes: wait FLUSH_DELAY, then write them all at once"""
+        while self.dirty_dates:
+            while self.dirty_dates:
+                await asyncio.sleep(FLUSH_DELAY)
+                await self.flush_data()
+            await self.export_calendars()
+            # save_data() doesn't start a new task while this one runs, so
+            # changes made during the export are picked up by going round again
+
+    async def export_calendars(self):
+        """Rewrite the .ics feeds that changed (nothing to do unless ICS_DIR is set)"""
+        if not ICS_DIR:
+            return
+        today = datetime.now()
+        await self.prefetch_archived(today + timedelta(days=i) for i in range(-ICS_PAST_DAYS, 0))
+        feeds = build_feeds(self)
+        if not feeds:
+            return
+        try:
+            await self.run(write_feeds, feeds)
+        except OSError as e:
+            print(f"[{self.key}] Error writing calendar feeds: {e}")
+            self.feed_windows.clear()  # write them all again next time
+
+    def save_data(self, date_str):
+        """Mark a date as changed; it gets written by the next background flush"""
+        self.change_version += 1
+        self.data_versions[date_str] = self.change_version
+        self.dirty_dates.add(date_str)
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+        self.schedule_live_edit(date_str)
+
+    # ---- routine posts ----
+    def last_post(self, channel_id):
+        """Message ID of the channel's last routine post, or None when it isn't known"""
+        post = self.routine_posts.get(str(channel_id))
+        return post[0] if post else None
+
+    async def remember_post(self, channel_id, message_id, date_str, content, embed):
+        """Record a channel's newest routine post: the next cleanup starts right after it, and live mode edits it"""
+        self.routine_posts[str(channel_id)] = [message_id, date_str]
+        self.live_shown[str(channel_id)] = shown_post(content, embed)
+        await self.run(self.store.set_meta, "routine_posts", dict(self.routine_posts))
+
+    def schedule_live_edit(self, date_str):
+        """Queue an edit of the live posts showing this date (nothing unless live mode is on)"""
+        if not self.live or date_str is None or not any(post[1] == date_str for post in self.routine_posts.values()):
+            return
+        self.live_pending.add(date_str)
+        if self.live_task is None or self.live_task.done():
+            self.live_task = asyncio.get_running_loop().create_task(self._edit_later())
+
+    async def _edit_later(self):
+        """Debounce: wait for LIVE_EDIT_DELAY without changes, then edit each affected post once"""
+        while self.live_pending:
+            waited = 0.0
+            while True:
+                seen = self.change_version
+                await asyncio.sleep(LIVE_EDIT_DELAY)
+                waited += LIVE_EDIT_DELAY
+                if self.change_version == seen or waited >= LIVE_EDIT_MAX_WAIT:
+                    break
+            dates, self.live_pending = self.live_pending, set()
+            for channel_id, (message_id, date_str) in list(self.routine_posts.items()):
+                if date_str is not None and date_str in dates:
+                    await self.edit_live_post(channel_id, message_id, date_str)
+
+    async def edit_live_post(self, channel_id, message_id, date_str):
+        """Edit one routine post to match its date's overrides, skipping the API call when nothing visible changed"""
+        day = datetime.strptime(date_str, "%Y-%m-%d")
+        await self.prefetch_archived([day])
+        content, embed = build_routine_message(self, day, preview=False)
+        shown = shown_post(content, embed)
+        if self.live_shown.get(channel_id) == shown:
+            telemetry.live_unchanged += 1
+            return
+        channel = bot.get_channel(int(channel_id))
+        if channel is None:
+            return
+        try:
+            # A partial message edits by ID, without fetching the message first
+            await channel.get_partial_message(message_id).edit(content=content, embed=embed)
+        except discord.NotFound:
+            # The post was deleted: keep it as the cleanup anchor but stop editing it
+            self.routine_posts[channel_id] = [message_id, None]
+            self.live_shown.pop(channel_id, None)
+            await self.run(self.store.set_meta, "routine_posts", dict(self.routine_posts))
+            return
+        except discord.HTTPException as e:
+            print(f"[{self.key}] Error editing the routine post in {channel}: {e}")
+            return
+        self.live_shown[channel_id] = shown
+        telemetry.live_edits += 1
+
+    async def clear(self):
+        """Drop every stored date of this partition"""
+        async with self.flush_lock:
+            self.schedule_data = {}
+            self.archived = {}
+            self.dirty_dates.clear()
+            self.render_cache.clear()
+            # Every date changed, so nothing rendered from the old overrides may be reused
+            self.change_version += 1
+            self.data_versions = dict.fromkeys(self.data_versions, self.change_version)
+            self.prepared_post = None
+            self.rooms_cache = None
+            self.schedule_cache.clear()
+            self.feed_cache.clear()
+            self.feed_windows.clear()
+            await self.run(self.store.clear)
+        await self.export_calendars()
+        for _, date_str in self.routine_posts.values():
+            self.schedule_live_edit(date_str)
+
+    async def close(self):
+        """Flush and release the store (on eviction or shutdown)"""
+        if self.live_task:
+            self.live_task.cancel()
+        if self.loaded:
+            await self.flush_data()
+            await self.run(self.store.close)
+        self.executor.shutdown(wait=False)
+
+    # ---- reading ----
+    def get_tomorrow_data(self):
+        """Get or create data for tomorrow"""
+        tomorrow = tomorrow_date().strftime("%Y-%m-%d")
+        return tomorrow, self.get_date_data(tomorrow)
+
+    def get_date_data(self, date_str):
+        """Get data for specific date"""
+        if date_str not in self.schedule_data:
+            # Past dates may have been moved out to the archive
+            self.schedule_data[date_str] = self.archived.pop(date_str, None) or new_date_entry()
+        return self.schedule_data[date_str]
+
+    def peek_date_data(self, date_str):
+        """Overrides for a date without creating an entry for it (a blank one when there are none)"""
+        data = self.schedule_data.get(date_str)
+        if data is None:
+            data = self.archived.get(date_str)
+        return data or new_date_entry()
+
+    def _read_archived(self, date_strs):
+        return {date_str: self.store.load_archived(date_str) for date_str in date_strs}
+
+    async def prefetch_archived(self, days):
+        """Read the archived ones among these dates on the worker, so rendering them never touches the disk"""
+        cutoff = retention_cutoff()
+        wanted = [day.strftime("%Y-%m-%d") for day in days]
+        missing = [d for d in wanted if d < cutoff and d not in self.schedule_data and d not in self.archived]
+        if missing:
+            self.archived.update(await self.run(self._read_archived, missing))
+
+    def schedule_for(self, day):
+        """The date's effective schedule (timetable plus overrides), cached per change version"""
+        date_str = day.strftime("%Y-%m-%d")
+        key = (self.season, timetable_generation, self.data_versions.get(date_str, 0))
+        cached = self.schedule_cache.get(date_str)
+        if cached is None or cached[0] != key:
+            cached = self.schedule_cache[date_str] = (key, effective_schedule(self.day_index(day), self.peek_date_data(date_str)))
+        return cached[1]
+
+    @property
+    def default_room(self):
+        timetable = TIMETABLES.get(self.season)
+        return self.room or (timetable and timetable.room) or DEFAULT_ROOM
+
+    def day_index(self, day):
+        """DayIndex for a date in this partition's timetable, or None when there are no classes"""
+        return TIMETABLE.get((self.season, day.strftime("%A").lower()))
+
+    def known_rooms(self):
+        """Default room plus every room used in the loaded dates, rebuilt only after a change"""
+        if self.rooms_cache is None or self.rooms_cache[0] != self.change_version:
+            rooms = {DEFAULT_ROOM, self.default_room}
+            rooms.update(data["room"] for data in self.schedule_data.values() if data["room"])
+            self.rooms_cache = (self.change_version, sorted(rooms))
+        return self.rooms_cache[1]
+
+    # ---- archive ----
+    async def archive_old_dates(self):
+        """Move dates older than the retention window out of the hot data"""
+        cutoff = retention_cutoff()
+        groups = {}
+        for date_str in [d for d in self.schedule_data if d < cutoff]:
+            groups.setdefault(date_str[:7], {})[date_str] = self.schedule_data.pop(date_str)
+            self.dirty_dates.discard(date_str)
+        if not groups:
+            return 0
+
+        try:
+            await self.run(self.store.archive, groups)
+        except Exception as e:
+            # Put everything back so nothing is lost; the next run retries
+            print(f"[{self.key}] Error archiving data: {e}")
+            for entries in groups.values():
+                self.schedule_data.update(entries)
+            return 0
+
+        # Rewrite the hot file without the archived dates
+        await self.flush_data(compact=True)
+        return sum(len(entries) for entries in groups.values())
+
+    async def holidays_between(self, start, end):
+        """Holidays in [start, end] as {date: reason}, stored and not yet flushed"""
+        holidays = await self.run(self.store.holidays_between, start, end)
+        # In-memory dates are the newest version of those dates
+        for date_str, data in self.schedule_data.items():
+            if start <= date_str <= end:
+                if data["is_holiday"]:
+                    holidays[date_str] = data["holiday_reason"]
+                else:
+                    holidays.pop(date_str, None)
+        return dict(sorted(holidays.items()))
+
+
+@tasks.loop(hours=1)
+async def refresh_calendars():
+    """Move the feeds' date window along as the days pass"""
+    for part in list(partitions.values()):
+        if part.loaded:
+            await part.export_calendars()
+
+@tasks.loop(minutes=5)
+async def evict_idle_partitions():
+    """Flush and forget partitions nobody has used for PARTITION_IDLE_TTL"""
+    now = time.monotonic()
+    for key, part in list(partitions.items()):
+        if now - part.last_used > PARTITION_IDLE_TTL and not part.dirty_dates:
+            del partitions[key]
+            await part.close()
+
+# ---------------- RENDERING ----------------
+RELATIVE_DAYS = {0: "Today's ", 1: "Tomorrow's "}
+
+def render_routine(part, day):
+    """Build the neutral (variant-independent) routine view for a date, cached per change version"""
+    date_str = day.strftime("%Y-%m-%d")
+    key = (part.season, timetable_generation, part.data_versions.get(date_str, 0))
+    cached = part.render_cache.get(date_str)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    data = part.peek_date_data(date_str)
+    day_name = day.strftime("%A")
+    schedule = part.schedule_for(day)
 
-# ---------------- COMMANDS ----------------
-@bot.command()
-async def test(ctx):
-    """Preview tomorrow's routine WITHOUT @everyone mention (for testing)"""
-    tomorrow = datetime.now() + timedelta(days=1)
-    tomorrow_str = tomorrow.strftime("%Y-%m-%d")
-    day_name = tomorrow.strftime("%A")
-    
-    data = get_date_data(tomorrow_str)
-    
-    # Check if it's a holiday
     if data["is_holiday"]:
+        rendered = {"kind": "holiday", "day_name": day_name, "reason": data["holiday_reason"]}
+    elif not schedule.bookings:
+        rendered = {"kind": "empty", "day_name": day_name}
+    else:
+        # Everything in time order, moved and cancelled classes included
+        fields = []
+        for booking in schedule.bookings:
+            group = f" — Group {booking.group}" if booking.group else ""
+            if booking.kind == "cancelled":
+                fields.append((booking.time + group, f"❌ ~~{booking.subject}~~"))
+            elif booking.kind == "moved":
+                fields.append((booking.time + group, f"🔄 ~~{booking.subject}~~ → Moved to {booking.note}"))
+            elif booking.kind == "rescheduled":
+                fields.append((f"🔄 {booking.time}{group}", f"{booking.subject} (Rescheduled)"))
+            elif booking.kind == "added":
+                fields.append((booking.time, f"🆕 {booking.subject}"))
+            else:
+                fields.append((booking.time + group, booking.subject))
+
+        if data["notice"]:
+            fields.append(("📢 Notice", data["notice"]))
+
+        rendered = {
+            "kind": "routine",
+            "day_name": day_name,
+            "room": data["room"] or part.default_room,
+            "fields": tuple(fields),
+        }
+
+    # Only the latest version of a date is worth keeping
+    part.render_cache[date_str] = (key, rendered)
+    return rendered
+
+def build_routine_message(part, day, preview):
+    """Apply the !test (preview) or !routine title, colour and footer to the cached view"""
+    rendered = render_routine(part, day)
+    day_name = rendered["day_name"]
+    mention = None if preview else "@everyone"
+    footer = f"B.E. Electrical • {part.season.title()} Routine"
+
+    if rendered["kind"] == "holiday":
         embed = discord.Embed(
-            title=f"🎉 Holiday - {day_name}, {tomorrow.strftime('%B %d')}",
-            description=data["holiday_reason"] or "No classes scheduled",
+            title=f"🎉 Holiday - {day_name}, {day.strftime('%B %d')}",
+            description=rendered["reason"] or "No classes scheduled",
             color=discord.Color.gold()
         )
-        embed.set_footer(text="B.E. Electrical • Winter Routine • TEST MODE")
-        await ctx.send(embed=embed)
-        return
-    
-    # Get routine data
-    routine_data = ROUTINES[CURRENT_SEASON].get(day_name.lower())
-    
-    if not routine_data:
-        await ctx.send(f"❌ No classes scheduled for {day_name}")
-        return
+        embed.set_footer(text=f"{footer} • TEST MODE" if preview else footer)
+        return mention, embed
+
+    if rendered["kind"] == "empty":
+        text = f"❌ No classes scheduled for {day_name}"
+        return (text if preview else f"@everyone {text}"), None
+
+    offset = (day.date() - datetime.now().date()).days
+    title = f"📘 {RELATIVE_DAYS.get(offset, '')}Routine ({day_name}, {day.strftime('%b %d')})"
+    embed = discord.Embed(
+        title=f"{title} - PREVIEW" if preview else title,
+        description=f"🏫 **Room:** {rendered['room']}",
+        color=discord.Color.orange() if preview else discord.Color.blue()
+    )
+    for name, value in rendered["fields"]:
+        embed.add_field(name=name, value=value, inline=False)
+    embed.set_footer(
+        text=f"{footer} • TEST MODE (No @everyone)" if preview
+        else f"{footer} | Use !help for commands"
+    )
+    return mention, embed
+
+def shown_post(content, embed):
+    """What a routine post looks like, in a form two renders can be compared by"""
+    return content, embed.to_dict() if embed else None
+
+def build_changes_message(data, tomorrow):
+    """(content, embed) listing a date's overrides, for !changes and /changes"""
+    if data["is_holiday"]:
+        return f"🎉 Tomorrow is a holiday: {data['holiday_reason']}", None
     
-    room = data["room"] or DEFAULT_ROOM
+    if not any([data["cancellations"], data["rescheduled"], data["added"], data["room"], data["notice"]]):
+        return f"📋 No changes for tomorrow ({tomorrow.strftime('%A, %b %d')})", None
     
     embed = discord.Embed(
-        title=f"📘 Tomorrow's Routine ({day_name}, {tomorrow.strftime('%b %d')}) - PREVIEW",
-        description=f"🏫 **Room:** {room}",
+        title=f"📋 Changes for Tomorrow ({tomorrow.strftime('%A, %b %d')})",
         color=discord.Color.orange()
     )
     
-    # Theory classes
-    embed.add_field(name="📖 Theory (Same for A & B)", value="\u200b", inline=False)
-    for time, subject in routine_data["theory"]:
-        if subject in data["cancellations"]:
-            embed.add_field(name=time, value=f"❌ ~~{subject}~~", inline=False)
-        elif subject in data["rescheduled"]:
-            new_time, new_name = data["rescheduled"][subject]
-            embed.add_field(name=time, value=f"🔄 ~~{subject}~~ → Moved to {new_time}", inline=False)
-        else:
-            embed.add_field(name=time, value=subject, inline=False)
+    if data["room"]:
+        embed.add_field(name="🏫 Room", value=data["room"], inline=False)
     
-    # Show rescheduled classes at their new time
-    for original, (new_time, new_name) in data["rescheduled"].items():
-        embed.add_field(name=f"🔄 {new_time}", value=f"{new_name} (Rescheduled)", inline=False)
+    if data["cancellations"]:
+        cancelled_list = "\n".join([f"❌ {s}" for s in data["cancellations"]])
+        embed.add_field(name="Cancelled Classes", value=cancelled_list, inline=False)
     
-    # Practical classes
-    if routine_data["practical"]:
-        embed.add_field(name="🧪 Practical", value="\u200b", inline=False)
-        for group, classes in routine_data["practical"].items():
-            for time, subject in classes:
-                label = f"{time} — Group {group}"
-                if subject in data["cancellations"]:
-                    embed.add_field(name=label, value=f"❌ ~~{subject}~~", inline=False)
-                elif subject in data["rescheduled"]:
-                    new_time, new_name = data["rescheduled"][subject]
-                    embed.add_field(name=label, value=f"🔄 ~~{subject}~~ → Moved to {new_time}", inline=False)
-                else:
-                    embed.add_field(name=label, value=subject, inline=False)
+    if data["rescheduled"]:
+        rescheduled_list = "\n".join([f"🔄 {orig} → {entry[0]}" for orig, entry in data["rescheduled"].items()])
+        embed.add_field(name="Rescheduled Classes", value=rescheduled_list, inline=False)
     
-    # Added classes
     if data["added"]:
-        embed.add_field(name="➕ Extra Classes", value="\u200b", inline=False)
-        for time, subject in data["added"]:
-            embed.add_field(name=time, value=f"🆕 {subject}", inline=False)
+        added_list = "\n".join([f"➕ {time}: {subj}" for time, subj in data["added"]])
+        embed.add_field(name="Extra Classes", value=added_list, inline=False)
     
-    # Notice
     if data["notice"]:
         embed.add_field(name="📢 Notice", value=data["notice"], inline=False)
     
-    embed.set_footer(text="B.E. Electrical • Winter Routine • TEST MODE (No @everyone)")
+    return None, embed
+
+async def holidays_message(part, month):
+    """Text listing the holidays in a "YYYY-MM" month (the current one when None)"""
+    month = month or datetime.now().strftime("%Y-%m")
+    try:
+        first = datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        return "❌ Use the month as YYYY-MM, e.g. `2025-12`"
     
-    await ctx.send(embed=embed)
+    found = await part.holidays_between(f"{month}-01", f"{month}-31")
+    if not found:
+        return f"📅 No holidays in {first.strftime('%B %Y')}"
+    
+    lines = [
+        f"🎉 {datetime.strptime(d, '%Y-%m-%d').strftime('%a, %b %d')}: {reason or 'Holiday'}"
+        for d, reason in found.items()
+    ]
+    return f"📅 **Holidays in {first.strftime('%B %Y')}**\n" + "\n".join(lines)
 
+# ---------------- CALENDAR FEEDS ----------------
+def feed_slots(day_index, feed):
+    """The slots a feed's students attend: everything for "all", else theory plus that group (breaks left out)"""
+    if day_index is None:
+        return ()
+    return [
+        slot for slot in day_index.slots
+        if slot.subject.lower() not in BREAK_SUBJECTS and (feed == "all" or slot.group is None or slot.group == feed)
+    ]
+
+def build_feeds(part):
+    """{path: .ics text} for the partition's feeds that changed, rebuilding only the changed dates"""
+    today = datetime.now()
+    days = [today + timedelta(days=i) for i in range(-ICS_PAST_DAYS, ICS_DAYS + 1)]
+    window = (days[0].strftime("%Y-%m-%d"), len(days))
+    groups = sorted({
+        group
+        for (season, _), day_index in TIMETABLE.items() if season == part.season
+        for group in day_index.by_group if group
+    })
+    dtstamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    name = part.key.replace(":", "_")
+
+    feeds = {}
+    for feed in ["all"] + groups:
+        chunks = []
+        changed = False
+        for day in days:
+            date_str = day.strftime("%Y-%m-%d")
+            key = (part.season, timetable_generation, part.data_versions.get(date_str, 0))
+            cached = part.feed_cache.get((feed, date_str))
+            if cached is None or cached[0] != key:
+                data = part.peek_date_data(date_str)
+                text = date_events(
+                    f"{feed}.{name}", day, feed_slots(part.day_index(day), feed),
+                    data, data["room"] or part.default_room, dtstamp
+                )
+                cached = part.feed_cache[(feed, date_str)] = (key, text)
+                changed = True
+            chunks.append(cached[1])
+
+        path = os.path.join(ICS_DIR, f"{name}-{feed}.ics")
+        if changed or part.feed_windows.get(path) != window:
+            title = f"B.E. Electrical {part.season.title()} Routine" + ("" if feed == "all" else f" (Group {feed})")
+            feeds[path] = build_calendar(title, chunks)
+            part.feed_windows[path] = window
+
+    # Forget dates that have scrolled out of the window
+    for cache_key in [k for k in part.feed_cache if k[1] < window[0]]:
+        del part.feed_cache[cache_key]
+    return feeds
+
+# ---------------- MULTI-DAY VIEWS ----------------
+RANGE_MAX_DAYS = 31
+PAGE_CHAR_LIMIT = 4000  # Discord allows 6000 characters per embed; leave room for title and footer
+FIELD_CHAR_LIMIT = 1024
+PAGE_TIMEOUT = 300  # seconds the page buttons keep working
+
+def parse_date_range(text):
+    """(first day, day count) from "YYYY-MM-DD" or "YYYY-MM-DD..YYYY-MM-DD"; raises ValueError"""
+    first, sep, last = text.replace(" to ", "..").partition("..")
+    start = datetime.strptime(first.strip(), "%Y-%m-%d")
+    end = datetime.strptime(last.strip(), "%Y-%m-%d") if sep else start
+    if end < start:
+        raise ValueError("the range ends before it starts")
+    count = (end - start).days + 1
+    if count > RANGE_MAX_DAYS:
+        raise ValueError(f"a range can cover at most {RANGE_MAX_DAYS} days")
+    return start, count
+
+class DateRangeArg(commands.Converter):
+    """Parses the !on argument into (first day, day count)"""
+    async def convert(self, ctx, argument):
+        try:
+            return parse_date_range(argument)
+        except ValueError as e:
+            if "does not match format" in str(e) or "unconverted data" in str(e):
+                e = "dates must look like 2025-12-01"
+            raise commands.BadArgument(f"❌ {e}. Usage: `!on 2025-12-01` or `!on 2025-12-01..2025-12-07`")
+
+def overlay_dates(part, start, count):
+    """(day, rendered view) for `count` days from `start`: base timetable plus stored overrides"""
+    days = [start + timedelta(days=i) for i in range(count)]
+    return [(day, render_routine(part, day)) for day in days]
+
+def day_summary(rendered):
+    """One day of a multi-day view as compact text"""
+    if rendered["kind"] == "holiday":
+        return f"🎉 Holiday: {rendered['reason'] or 'No classes'}"
+    if rendered["kind"] == "empty":
+        return "No classes scheduled"
+    lines = [f"🏫 {rendered['room']}"]
+    lines += [f"`{name}` {value}" for name, value in rendered["fields"]]
+    return "\n".join(lines)
+
+def split_text(text, limit):
+    """Split on line breaks into chunks of at most `limit` characters"""
+    chunks, current = [], ""
+    for line in text.split("\n"):
+        line = line[:limit]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    chunks.append(current)
+    return chunks
+
+async def range_pages(part, start, count, title):
+    """build_range_pages, after reading any archived dates in the range on the partition's worker"""
+    await part.prefetch_archived(start + timedelta(days=i) for i in range(count))
+    return build_range_pages(part, start, count, title)
+
+def build_range_pages(part, start, count, title):
+    """Embeds for a run of days, one field per day, split into pages that fit Discord's limits"""
+    pages = []
+    embed, size, fields = None, 0, 0
+    for day, rendered in overlay_dates(part, start, count):
+        name = day.strftime("%a, %b %d")
+        for i, chunk in enumerate(split_text(day_summary(rendered), FIELD_CHAR_LIMIT)):
+            field_name = name if i == 0 else f"{name} (cont.)"
+            if embed is None or size + len(field_name) + len(chunk) > PAGE_CHAR_LIMIT or fields == 25:
+                embed = discord.Embed(title=title, color=discord.Color.blue())
+                pages.append(embed)
+                size, fields = len(title), 0
+            embed.add_field(name=field_name, value=chunk, inline=False)
+            size += len(field_name) + len(chunk)
+            fields += 1
+
+    footer = f"B.E. Electrical • {part.season.title()} Routine"
+    for number, page in enumerate(pages, 1):
+        page.set_footer(text=f"{footer} • Page {number}/{len(pages)}" if len(pages) > 1 else footer)
+    return pages
+
+
+class PageView(discord.ui.View):
+    """◀ / ▶ buttons flipping through the pages of a multi-day view"""
+
+    def __init__(self, pages):
+        super().__init__(timeout=PAGE_TIMEOUT)
+        self.pages = pages
+        self.index = 0
+        self.message = None
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.index == 0
+        self.next_page.disabled = self.index == len(self.pages) - 1
+
+    async def show(self, interaction, step):
+        self.index = max(0, min(len(self.pages) - 1, self.index + step))
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.pages[self.index], view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self.show(interaction, -1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self.show(interaction, 1)
+
+    async def on_timeout(self):
+        if self.message:
+            for item in self.children:
+                item.disabled = True
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+def range_title(start, count):
+    if count == 1:
+        return f"🗓️ {start.strftime('%A, %b %d %Y')}"
+    end = start + timedelta(days=count - 1)
+    return f"🗓️ {start.strftime('%a, %b %d')} – {end.strftime('%a, %b %d %Y')}"
+
+async def send_pages(target, pages):
+    """Send the first page, with buttons when there are more; `target` is a ctx or an interaction"""
+    view = PageView(pages) if len(pages) > 1 else None
+    extra = {"view": view} if view else {}
+    if isinstance(target, discord.Interaction):
+        message = await slash_reply(target, embed=pages[0], **extra)
+        if message is None and view:
+            message = await target.original_response()
+    else:
+        message = await target.send(embed=pages[0], **extra)
+    if view:
+        view.message = message
+
+# ---------------- AUTO-POST ----------------
+def autopost_time(config):
+    """The configured HH:MM post time as a datetime.time, or None when it's missing/invalid"""
+    autopost = config.get("autopost")
+    if not autopost:
+        return None
+    try:
+        return datetime.strptime(autopost["time"], "%H:%M").time()
+    except (KeyError, ValueError):
+        return None
+
+def prepare_post(part, day):
+    """Render the routine post ahead of time, reusing it until the date changes again"""
+    date_str = day.strftime("%Y-%m-%d")
+    version = (timetable_generation, part.data_versions.get(date_str, 0))
+    if not part.prepared_post or part.prepared_post[:2] != (date_str, version):
+        content, embed = build_routine_message(part, day, preview=False)
+        part.prepared_post = (date_str, version, content, embed)
+    return part.prepared_post[2:]
+
+@tasks.loop(seconds=30)
+async def autopost_routines():
+    """Post tomorrow's routine at each configured time, catching up on posts missed while offline"""
+    now = datetime.now()
+    tomorrow = now + timedelta(days=1)
+    tomorrow_str = tomorrow.strftime("%Y-%m-%d")
+
+    for key, config in partition_config.items():
+        post_time = autopost_time(config)
+        if post_time is None or autopost_done.get(key) == tomorrow_str:
+            continue
+        post_at = datetime.combine(now.date(), post_time)
+        if now < post_at - AUTOPOST_LEAD:
+            continue
+
+        try:
+            part = await load_partition(key)
+            # The last posted date is persisted so a restart never posts twice
+            if await part.run(part.store.get_meta, "autopost_last") == tomorrow_str:
+                autopost_done[key] = tomorrow_str
+                continue
+
+            if now < post_at:
+                prepare_post(part, tomorrow)
+                continue
+
+            # A section partition ("<guild>:<channel>") posts in its own channel by default
+            channel_id = config["autopost"].get("channel") or (key.split(":")[1] if ":" in key else None)
+            channel = bot.get_channel(int(channel_id)) if channel_id else None
+            if channel is None:
+                print(f"[{key}] Autopost channel {channel_id} not found")
+                continue
+
+            content, embed = prepare_post(part, tomorrow)
+            message = await channel.send(content, embed=embed)
+            autopost_done[key] = tomorrow_str
+            await part.run(part.store.set_meta, "autopost_last", tomorrow_str)
+            await part.remember_post(channel.id, message.id, tomorrow_str, content, embed)
+            print(f"📬 [{key}] Auto-posted the routine for {tomorrow_str}")
+        except Exception as e:
+            print(f"[{key}] Error auto-posting: {e}")
+
+@autopost_routines.before_loop
+async def before_autopost():
+    await bot.wait_until_ready()
+
+# ---------------- CHANNEL CLEANUP ----------------
+def is_command_noise(message):
+    """The bot's own replies and the messages that invoked its commands; conversation is left alone"""
+    if message.author == bot.user:
+        return True
+    content = message.content or ""
+    if not content.startswith(bot.command_prefix):
+        return False
+    name = content[len(bot.command_prefix):].split(None, 1)
+    return bool(name) and bot.get_command(name[0]) is not None
+
+async def cleanup_channel(channel, anchor=None, scan_limit=None):
+    """Bulk-delete the command messages and replies posted since the last routine post
+
+    `anchor` is that post's message ID when it was tracked, so history starts
+    right after it. Without one, recent history is scanned for the bot's own
+    last @everyone post instead.
+    """
+    if not hasattr(channel, "delete_messages"):
+        return 0  # DMs can't bulk-delete, and there's nobody else's noise to clear there
+    started = time.perf_counter()
+    scan_limit = scan_limit or CLEANUP_SCAN_LIMIT
+    last_everyone_found = False
+    messages_to_delete = []
+    deleted = 0
 
-@bot.command()
-async def routine(ctx):
-    """Display tomorrow's routine with @everyone mention and clear previous command messages"""
-    # Try to delete recent command messages in this channel
     try:
-        # Fetch recent messages (up to 100)
-        last_everyone_found = False
-        messages_to_delete = []
-        
-        async for message in ctx.channel.history(limit=5):
-            # Check if this message has @everyone (previous routine post)
-            if "@everyone" in (message.content or ""):
-                last_everyone_found = True
-                break
-            
-            # Collect messages to delete (all messages until we hit @everyone)
-            messages_to_delete.append(message)
-        
-        # If @everyone found, delete all messages between
-        # If not found, delete only last 10 messages max
-        if not last_everyone_found:
-            messages_to_delete = messages_to_delete[:10]
-        
-        # Delete collected messages
-        for message in messages_to_delete:
+        if anchor:
+            # Still a valid starting point if the post itself was deleted since
+            messages_to_delete = [
+                m async for m in channel.history(limit=CLEANUP_MAX, after=discord.Object(id=anchor))
+                if is_command_noise(m)
+            ]
+        else:
+            async for message in channel.history(limit=scan_limit):
+                # Check if this message is the bot's previous routine post
+                if message.author == bot.user and "@everyone" in (message.content or ""):
+                    last_everyone_found = True
+                    break
+                if is_command_noise(message):
+                    messages_to_delete.append(message)
+
+            # Without an anchor we can't tell command noise from conversation,
+            # so only the most recent few messages are removed
+            if not last_everyone_found:
+                messages_to_delete = messages_to_delete[:10]
+
+        # The bulk endpoint rejects messages older than 14 days
+        bulk_cutoff = discord.utils.utcnow() - timedelta(days=14)
+        recent = [m for m in messages_to_delete if m.created_at > bulk_cutoff]
+        old = [m for m in messages_to_delete if m.created_at <= bulk_cutoff]
+
+        for i in range(0, len(recent), 100):
+            chunk = recent[i:i + 100]
+            await channel.delete_messages(chunk)
+            deleted += len(chunk)
+
+        for message in old:
             try:
                 await message.delete()
-            except:
+                deleted += 1
+            except discord.HTTPException:
                 pass
-    except Exception as e:
+    except discord.HTTPException as e:
         print(f"Error deleting messages: {e}")
-    
-    tomorrow = datetime.now() + timedelta(days=1)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    how = "after the tracked post" if anchor else "by scanning history"
+    print(f"🧹 Cleanup in #{channel}: deleted {deleted} message(s) {how} in {elapsed_ms:.0f} ms")
+    return deleted
+
+# ---------------- BATCH OPERATIONS ----------------
+# Each operation edits a working copy of one date's entry and returns a summary
+# line, or raises BatchError; !batch only saves when every line went through.
+BATCH_MAX_LINES = 25
+
+class BatchError(Exception):
+    """A batch line that can't be applied"""
+
+def split_time(arg, usage):
+    """Split a leading (optionally quoted) time off an argument, checking it parses"""
+    parts = arg.split(None, 1)
+    if not parts:
+        raise BatchError(f"usage: `{usage}`")
+    time_text = parts[0].strip('"')
+    try:
+        parse_time_range(time_text)
+    except ValueError as e:
+        raise BatchError(f"{e} (use HH:MM or HH:MM-HH:MM)")
+    return time_text, parts[1].strip() if len(parts) > 1 else ""
+
+def batch_cancel(part, day, data, arg):
+    if not arg:
+        raise BatchError("usage: `cancel <search>`")
+    day_index = part.day_index(day)
+    candidates = list(day_index.by_subject) if day_index else []
+    for _, subject in data["added"]:
+        SEARCH_INDEX.add(subject)
+        candidates.append(subject)
+    if not candidates:
+        raise BatchError("no classes scheduled")
+
+    # Autocomplete hands over exact names, no need to search for those
+    exact = exact_match(arg, candidates)
+    ranked = [(exact, 0)] if exact else SEARCH_INDEX.search(arg, candidates)
+    if not ranked:
+        raise BatchError(f"no class found matching '{arg}'")
+    subject = pick_match(ranked, arg)
+    if not subject:
+        options = ", ".join(s for s, _ in ranked[:3])
+        raise BatchError(f"'{arg}' matches several classes ({options}); be more specific")
+    if subject not in data["cancellations"]:
+        data["cancellations"].append(subject)
+    return f"❌ Cancelled **{subject}**"
+
+def batch_cancelall(part, day, data, arg):
+    day_index = part.day_index(day)
+    if not day_index:
+        raise BatchError("no classes scheduled")
+    cancelled = set(data["cancellations"])
+    new = [subject for subject in day_index.by_subject if subject not in cancelled]
+    data["cancellations"].extend(new)
+    return f"❌ Cancelled all {len(new)} classes"
+
+def batch_uncancel(part, day, data, arg):
+    if not arg:
+        raise BatchError("usage: `uncancel <search>`")
+    if not data["cancellations"]:
+        raise BatchError("no classes are cancelled")
+    for subject in data["cancellations"]:
+        SEARCH_INDEX.add(subject)
+    exact = exact_match(arg, data["cancellations"])
+    ranked = [(exact, 0)] if exact else SEARCH_INDEX.search(arg, data["cancellations"])
+    if not ranked:
+        raise BatchError(f"no cancelled class found matching '{arg}'")
+    subject = pick_match(ranked, arg)
+    if not subject:
+        options = ", ".join(s for s, _ in ranked[:3])
+        raise BatchError(f"'{arg}' matches several cancelled classes ({options}); be more specific")
+    data["cancellations"].remove(subject)
+    return f"✅ Restored **{subject}**"
+
+def batch_reschedule(part, day, data, arg):
+    usage = "reschedule <old_time> <new_time> [subject]"
+    original_time, rest = split_time(arg, usage)
+    new_time, subject_name = split_time(rest, usage)
+    day_index = part.day_index(day)
+    if not day_index:
+        raise BatchError("no classes scheduled")
+    slot = find_slot(day_index, parse_time_range(original_time)[0])
+    if not slot:
+        raise BatchError(f"no class found at {original_time}")
+    start, end = class_interval(new_time, slot.end - slot.start)
+    clashes = find_clashes(effective_schedule(day_index, data), start, end, slot.group, moving=slot.subject)
+    if clashes:
+        raise BatchError(f"{new_time} clashes with {describe_clashes(clashes)}")
+    data["rescheduled"][slot.subject] = [new_time, subject_name or slot.subject, slot.time]
+    group = f" (Group {slot.group})" if slot.group else ""
+    return f"🔄 Rescheduled **{slot.subject}**{group} from {slot.time} to {new_time}"
+
+def batch_addclass(part, day, data, arg):
+    time_text, subject = split_time(arg, "addclass <time> <subject>")
+    if not subject:
+        raise BatchError("usage: `addclass <time> <subject>`")
+    start, end = class_interval(time_text)
+    clashes = find_clashes(effective_schedule(part.day_index(day), data), start, end, None)
+    if clashes:
+        raise BatchError(f"{time_text} clashes with {describe_clashes(clashes)}")
+    data["added"].append([time_text, subject])
+    return f"➕ Added **{subject}** at {time_text}"
+
+def batch_room(part, day, data, arg):
+    if not arg:
+        raise BatchError("usage: `room <room_name>`")
+    data["room"] = arg
+    return f"🏫 Room changed to **{arg}**"
+
+def batch_notice(part, day, data, arg):
+    if not arg:
+        raise BatchError("usage: `notice <message>`")
+    data["notice"] = arg
+    return f"📢 Notice: {arg}"
+
+def batch_holiday(part, day, data, arg):
+    data["is_holiday"] = True
+    data["holiday_reason"] = arg or "Holiday"
+    return f"🎉 Marked as holiday: {data['holiday_reason']}"
+
+def batch_unholiday(part, day, data, arg):
+    data["is_holiday"] = False
+    data["holiday_reason"] = None
+    return "📅 Holiday status removed"
+
+BATCH_OPS = {
+    "cancel": batch_cancel,
+    "cancelall": batch_cancelall,
+    "uncancel": batch_uncancel,
+    "reschedule": batch_reschedule,
+    "addclass": batch_addclass,
+    "room": batch_room,
+    "notice": batch_notice,
+    "holiday": batch_holiday,
+    "unholiday": batch_unholiday,
+}
+
+def apply_batch(part, day, data, lines):
+    """Run every line against a copy of `data`: (new entry, summary lines) or BatchError naming the bad line"""
+    working = copy.deepcopy(data)
+    summary = []
+    for number, line in enumerate(lines, 1):
+        name, _, arg = line.lstrip("!").partition(" ")
+        op = BATCH_OPS.get(name.lower())
+        if op is None:
+            raise BatchError(f"line {number}: unknown operation `{name}`")
+        try:
+            summary.append(op(part, day, working, arg.strip()))
+        except BatchError as e:
+            raise BatchError(f"line {number} (`{line}`): {e}")
+    return working, summary
+
+def apply_change(part, op, arg=""):
+    """Run one batch operation on tomorrow's entry and save it; the confirmation line, or BatchError
+
+    Every single-change command goes through here, prefix and slash alike.
+    """
+    tomorrow = tomorrow_date()
     tomorrow_str = tomorrow.strftime("%Y-%m-%d")
-    day_name = tomorrow.strftime("%A")
-    
-    data = get_date_data(tomorrow_str)
-    
-    # Check if it's a holiday
-    if data["is_holiday"]:
-        embed = discord.Embed(
-            title=f"🎉 Holiday - {day_name}, {tomorrow.strftime('%B %d')}",
-            description=data["holiday_reason"] or "No classes scheduled",
-            color=discord.Color.gold()
-        )
-        embed.set_footer(text="B.E. Electrical • Winter Routine")
-        await ctx.send("@everyone", embed=embed)
-        return
-    
-    # Get routine data
-    routine_data = ROUTINES[CURRENT_SEASON].get(day_name.lower())
-    
-    if not routine_data:
-        await ctx.send(f"@everyone ❌ No classes scheduled for {day_name}")
-        return
-    
-    room = data["room"] or DEFAULT_ROOM
-    
-    embed = discord.Embed(
-        title=f"📘 Tomorrow's Routine ({day_name}, {tomorrow.strftime('%b %d')})",
-        description=f"🏫 **Room:** {room}",
-        color=discord.Color.blue()
-    )
-    
-    # Theory classes
-    embed.add_field(name="📖 Theory (Same for A & B)", value="\u200b", inline=False)
-    for time, subject in routine_data["theory"]:
-        # Check if cancelled
-        if subject in data["cancellations"]:
-            embed.add_field(name=time, value=f"❌ ~~{subject}~~", inline=False)
-        # Check if rescheduled
-        elif subject in data["rescheduled"]:
-            new_time, new_name = data["rescheduled"][subject]
-            embed.add_field(name=time, value=f"🔄 ~~{subject}~~ → Moved to {new_time}", inline=False)
-        else:
-            embed.add_field(name=time, value=subject, inline=False)
-    
-    # Show rescheduled classes at their new time
-    for original, (new_time, new_name) in data["rescheduled"].items():
-        embed.add_field(name=f"🔄 {new_time}", value=f"{new_name} (Rescheduled)", inline=False)
-    
-    # Practical classes
-    if routine_data["practical"]:
-        embed.add_field(name="🧪 Practical", value="\u200b", inline=False)
-        for group, classes in routine_data["practical"].items():
-            for time, subject in classes:
-                label = f"{time} — Group {group}"
-                if subject in data["cancellations"]:
-                    embed.add_field(name=label, value=f"❌ ~~{subject}~~", inline=False)
-                elif subject in data["rescheduled"]:
-                    new_time, new_name = data["rescheduled"][subject]
-                    embed.add_field(name=label, value=f"🔄 ~~{subject}~~ → Moved to {new_time}", inline=False)
-                else:
-                    embed.add_field(name=label, value=subject, inline=False)
-    
-    # Added classes
-    if data["added"]:
-        embed.add_field(name="➕ Extra Classes", value="\u200b", inline=False)
-        for time, subject in data["added"]:
-            embed.add_field(name=time, value=f"🆕 {subject}", inline=False)
-    
-    # Notice
-    if data["notice"]:
-        embed.add_field(name="📢 Notice", value=data["notice"], inline=False)
-    
-    embed.set_footer(text="B.E. Electrical • Winter Routine | Use !help for commands")
-    
-    await ctx.send("@everyone", embed=embed)
+    # The stored entry is only replaced once the operation went through
+    data = copy.deepcopy(part.get_date_data(tomorrow_str))
+    summary = op(part, tomorrow, data, arg.strip())
+    part.schedule_data[tomorrow_str] = data
+    part.save_data(tomorrow_str)
+    return f"{summary} for tomorrow ({tomorrow.strftime('%A, %b %d')})"
+
+def change_error(error):
+    message = str(error)
+    return message[:1].upper() + message[1:]
+
+async def prefix_change(ctx, op, arg=""):
+    """apply_change for a prefix command, replying in the channel"""
+    part = await get_partition(ctx)
+    try:
+        await ctx.send(apply_change(part, op, arg))
+    except BatchError as e:
+        await ctx.send(f"❌ {change_error(e)}")
+
+# ---------------- TELEMETRY ----------------
+class RateLimitCounter(logging.Handler):
+    """Counts the 429 warnings discord.py logs; the HTTP client retries them internally"""
+
+    def emit(self, record):
+        if "rate limited" in record.getMessage():
+            telemetry.rate_limits += 1
+
+def count_api_calls(http):
+    """Wrap the HTTP client so every Discord REST request is counted by method"""
+    request = http.request
+
+    async def counted_request(route, *args, **kwargs):
+        telemetry.count_api_call(route.method)
+        return await request(route, *args, **kwargs)
+
+    http.request = counted_request
+
+def write_metrics_file():
+    """Write the Prometheus export atomically so a scraper never reads half a file"""
+    tmp_file = METRICS_FILE + ".tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(telemetry.render_prometheus())
+    os.replace(tmp_file, METRICS_FILE)
+
+@tasks.loop(seconds=METRICS_INTERVAL)
+async def export_metrics():
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, write_metrics_file)
+    except Exception as e:
+        print(f"Error writing metrics: {e}")
+
+# ---------------- BOT ----------------
+class RoutineBot(commands.AutoShardedBot):
+    async def setup_hook(self):
+        # Partition data is loaded lazily, the first time a guild uses a command
+        load_partition_config()
+        evict_idle_partitions.start()
+        autopost_routines.start()
+        reload_timetables.start()
+        if ICS_DIR:
+            refresh_calendars.start()
+        count_api_calls(self.http)
+        logging.getLogger("discord.http").addHandler(RateLimitCounter(logging.WARNING))
+        if METRICS_FILE:
+            export_metrics.start()
+        try:
+            synced = await self.tree.sync()
+            print(f"🔗 Synced {len(synced)} slash command(s)")
+        except discord.HTTPException as e:
+            print(f"Error syncing slash commands: {e}")
+        try:
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGTERM, lambda: asyncio.ensure_future(self.close())
+            )
+        except NotImplementedError:
+            pass  # Windows
+
+    async def on_command_error(self, ctx, error):
+        if isinstance(error, commands.BadArgument):
+            await ctx.send(str(error))
+            return
+        if isinstance(error, commands.CheckFailure):
+            await ctx.send("❌ You don't have permission to use this command")
+            return
+        await super().on_command_error(ctx, error)
+
+    async def close(self):
+        """Flush pending changes before disconnecting so no update is lost"""
+        evict_idle_partitions.cancel()
+        autopost_routines.cancel()
+        reload_timetables.cancel()
+        refresh_calendars.cancel()
+        export_metrics.cancel()
+        await asyncio.gather(*(part.close() for part in partitions.values()))
+        await super().close()
+
+
+intents = discord.Intents.default()
+intents.message_content = True
+bot = RoutineBot(command_prefix="!", intents=intents)
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
+
+@bot.after_invoke
+async def record_command_latency(ctx):
+    # Runs whether or not the command raised
+    elapsed_ms = (time.perf_counter() - ctx.started_at) * 1000
+    telemetry.observe_command(ctx.command.qualified_name, elapsed_ms, ctx.command_failed)
+
+# ---------------- EVENTS ----------------
+@bot.event
+async def on_ready():
+    print(f"✅ Logged in as {bot.user}")
+
+# ---------------- COMMANDS ----------------
+@bot.command()
+async def test(ctx):
+    """Preview tomorrow's routine WITHOUT @everyone mention (for testing)"""
+    part = await get_partition(ctx)
+    tomorrow = tomorrow_date()
+    content, embed = build_routine_message(part, tomorrow, preview=True)
+    await ctx.send(content, embed=embed)
+
+
+@bot.command()
+async def routine(ctx):
+    """Display tomorrow's routine with @everyone mention and clear previous command messages"""
+    part = await get_partition(ctx)
+    # Clear the command messages left since the previous routine post
+    await cleanup_channel(ctx.channel, part.last_post(ctx.channel.id))
+    
+    tomorrow = tomorrow_date()
+    content, embed = build_routine_message(part, tomorrow, preview=False)
+    message = await ctx.send(content, embed=embed)
+    await part.remember_post(ctx.channel.id, message.id, tomorrow.strftime("%Y-%m-%d"), content, embed)
 
 
 @bot.command()
 async def cancel(ctx, *, search_term: str):
     """Cancel a class for tomorrow. Usage: !cancel electric (searches lazily)"""
-    tomorrow = datetime.now() + timedelta(days=1)
-    tomorrow_str = tomorrow.strftime("%Y-%m-%d")
-    day_name = tomorrow.strftime("%A").lower()
-    
-    data = get_date_data(tomorrow_str)
-    routine_data = ROUTINES[CURRENT_SEASON].get(day_name)
-    
-    if not routine_data:
-        await ctx.send("❌ No classes scheduled for tomorrow")
-        return
-    
-    # Collect all subjects
-    all_subjects = []
-    for _, subject in routine_data["theory"]:
-        all_subjects.append(subject)
-    if routine_data["practical"]:
-        for classes in routine_data["practical"].values():
-            for _, subject in classes:
-                if subject not in all_subjects:
-                    all_subjects.append(subject)
-    
-    # Find matching subjects (case-insensitive partial match)
-    search_lower = search_term.lower()
-    matches = [s for s in all_subjects if search_lower in s.lower()]
-    
-    if not matches:
-        await ctx.send(f"❌ No class found matching '{search_term}'")
-        return
-    
-    if len(matches) == 1:
-        subject = matches[0]
-        if subject not in data["cancellations"]:
-            data["cancellations"].append(subject)
-            save_data()
-            await ctx.send(f"✅ Cancelled **{subject}** for tomorrow ({tomorrow.strftime('%A, %b %d')})")
-        else:
-            await ctx.send(f"⚠️ **{subject}** is already cancelled for tomorrow")
-    else:
-        # Multiple matches - show options
-        matches_list = "\n".join([f"{i+1}. {s}" for i, s in enumerate(matches)])
-        await ctx.send(f"🔍 Multiple matches found for '{search_term}':\n{matches_list}\n\nPlease be more specific!")
+    await prefix_change(ctx, batch_cancel, search_term)
 
 
 @bot.command()
 async def cancelall(ctx):
     """Cancel all classes for tomorrow"""
-    tomorrow = datetime.now() + timedelta(days=1)
-    tomorrow_str = tomorrow.strftime("%Y-%m-%d")
-    day_name = tomorrow.strftime("%A").lower()
-    
-    data = get_date_data(tomorrow_str)
-    routine_data = ROUTINES[CURRENT_SEASON].get(day_name)
-    
-    if not routine_data:
-        await ctx.send("❌ No classes scheduled for tomorrow")
-        return
-    
-    count = 0
-    for _, subject in routine_data["theory"]:
-        if subject not in data["cancellations"]:
-            data["cancellations"].append(subject)
-            count += 1
-    
-    if routine_data["practical"]:
-        for classes in routine_data["practical"].values():
-            for _, subject in classes:
-                if subject not in data["cancellations"]:
-                    data["cancellations"].append(subject)
-                    count += 1
-    
-    save_data()
-    await ctx.send(f"✅ Cancelled all {count} classes for tomorrow ({tomorrow.strftime('%A, %b %d')})")
+    await prefix_change(ctx, batch_cancelall)
 
 
 @bot.command()
 async def uncancel(ctx, *, search_term: str):
     """Restore a cancelled class for tomorrow. Usage: !uncancel electric"""
-    tomorrow_str, data = get_tomorrow_data()
-    
-    if not data["cancellations"]:
-        await ctx.send("⚠️ No classes are cancelled for tomorrow")
-        return
-    
-    # Find matching cancelled subjects
-    search_lower = search_term.lower()
-    matches = [s for s in data["cancellations"] if search_lower in s.lower()]
-    
-    if not matches:
-        await ctx.send(f"❌ No cancelled class found matching '{search_term}'")
-        return
-    
-    if len(matches) == 1:
-        subject = matches[0]
-        data["cancellations"].remove(subject)
-        save_data()
-        
-        tomorrow = datetime.now() + timedelta(days=1)
-        await ctx.send(f"✅ Restored **{subject}** for tomorrow ({tomorrow.strftime('%A, %b %d')})")
-    else:
-        matches_list = "\n".join([f"{i+1}. {s}" for i, s in enumerate(matches)])
-        await ctx.send(f"🔍 Multiple matches found:\n{matches_list}\n\nPlease be more specific!")
+    await prefix_change(ctx, batch_uncancel, search_term)
 
 
 @bot.command()
-async def reschedule(ctx, original_time: str, new_time: str, *, subject_name: str = None):
+async def reschedule(ctx, original_time: TimeArg, new_time: TimeArg, *, subject_name: str = ""):
     """Reschedule a class for tomorrow. Usage: !reschedule "10:15" "14:00" Subject Name"""
-    tomorrow = datetime.now() + timedelta(days=1)
-    tomorrow_str = tomorrow.strftime("%Y-%m-%d")
-    day_name = tomorrow.strftime("%A").lower()
-    
-    data = get_date_data(tomorrow_str)
-    routine_data = ROUTINES[CURRENT_SEASON].get(day_name)
-    
-    if not routine_data:
-        await ctx.send("❌ No classes scheduled for tomorrow")
-        return
-    
-    # Find the class at original time
-    found = False
-    for time, subject in routine_data["theory"]:
-        if original_time in time or time in original_time:
-            data["rescheduled"][subject] = [new_time, subject_name or subject]
-            save_data()
-            await ctx.send(f"✅ Rescheduled **{subject}** from {time} to {new_time} for tomorrow ({tomorrow.strftime('%A, %b %d')})")
-            found = True
-            break
-    
-    if not found and routine_data["practical"]:
-        for group, classes in routine_data["practical"].items():
-            for time, subject in classes:
-                if original_time in time or time in original_time:
-                    data["rescheduled"][subject] = [new_time, subject_name or subject]
-                    save_data()
-                    await ctx.send(f"✅ Rescheduled **{subject}** (Group {group}) from {time} to {new_time} for tomorrow ({tomorrow.strftime('%A, %b %d')})")
-                    found = True
-                    break
-    
-    if not found:
-        await ctx.send(f"❌ No class found at {original_time}")
+    await prefix_change(ctx, batch_reschedule, f"{original_time} {new_time} {subject_name}")
 
 
 @bot.command()
-async def addclass(ctx, time: str, *, subject: str):
+async def addclass(ctx, time: TimeArg, *, subject: str):
     """Add an extra class for tomorrow. Usage: !addclass "14:00-15:00" Subject Name"""
-    tomorrow_str, data = get_tomorrow_data()
-    
-    data["added"].append([time, subject])
-    save_data()
-    
-    tomorrow = datetime.now() + timedelta(days=1)
-    await ctx.send(f"✅ Added **{subject}** at {time} for tomorrow ({tomorrow.strftime('%A, %b %d')})")
+    await prefix_change(ctx, batch_addclass, f"{time} {subject}")
 
 
 @bot.command()
 async def room(ctx, room_name: str):
     """Change room for tomorrow. Usage: !room D204"""
-    tomorrow_str, data = get_tomorrow_data()
-    
-    data["room"] = room_name
-    save_data()
-    
-    tomorrow = datetime.now() + timedelta(days=1)
-    await ctx.send(f"✅ Room changed to **{room_name}** for tomorrow ({tomorrow.strftime('%A, %b %d')})")
+    await prefix_change(ctx, batch_room, room_name)
 
 
 @bot.command()
 async def notice(ctx, *, message: str):
     """Add a notice for tomorrow. Usage: !notice Remember to bring your notebooks"""
-    tomorrow_str, data = get_tomorrow_data()
-    
-    data["notice"] = message
-    save_data()
-    
-    tomorrow = datetime.now() + timedelta(days=1)
-    await ctx.send(f"✅ Notice added for tomorrow ({tomorrow.strftime('%A, %b %d')}): {message}")
+    await prefix_change(ctx, batch_notice, message)
 
 
 @bot.command()
 async def holiday(ctx, *, reason: str = "Holiday"):
     """Mark tomorrow as a holiday. Usage: !holiday Dashain Festival"""
-    tomorrow_str, data = get_tomorrow_data()
-    
-    data["is_holiday"] = True
-    data["holiday_reason"] = reason
-    save_data()
-    
-    tomorrow = datetime.now() + timedelta(days=1)
-    await ctx.send(f"✅ Tomorrow ({tomorrow.strftime('%A, %b %d')}) marked as holiday: {reason}")
+    await prefix_change(ctx, batch_holiday, reason)
 
 
 @bot.command()
 async def unholiday(ctx):
     """Remove holiday status from tomorrow"""
-    tomorrow_str, data = get_tomorrow_data()
-    
-    data["is_holiday"] = False
-    data["holiday_reason"] = None
-    save_data()
-    
-    tomorrow = datetime.now() + timedelta(days=1)
-    await ctx.send(f"✅ Holiday status removed for tomorrow ({tomorrow.strftime('%A, %b %d')})")
+    await prefix_change(ctx, batch_unholiday)
 
 
 @bot.command()
-async def changes(ctx):
-    """Show all current changes for tomorrow"""
-    tomorrow = datetime.now() + timedelta(days=1)
+async def batch(ctx, *, operations: str):
+    """Apply several changes for tomorrow in one go, one per line. Usage: !batch followed by lines like `cancel dsp`"""
+    part = await get_partition(ctx)
+    tomorrow = tomorrow_date()
     tomorrow_str = tomorrow.strftime("%Y-%m-%d")
     
-    data = get_date_data(tomorrow_str)
-    
-    if data["is_holiday"]:
-        await ctx.send(f"🎉 Tomorrow is a holiday: {data['holiday_reason']}")
+    lines = [line.strip() for line in operations.splitlines() if line.strip()]
+    if len(lines) > BATCH_MAX_LINES:
+        await ctx.send(f"❌ A batch can hold at most {BATCH_MAX_LINES} changes")
         return
     
-    if not any([data["cancellations"], data["rescheduled"], data["added"], data["room"], data["notice"]]):
-        await ctx.send(f"📋 No changes for tomorrow ({tomorrow.strftime('%A, %b %d')})")
+    # All or nothing: the entry is only replaced once every line has been applied
+    try:
+        data, summary = apply_batch(part, tomorrow, part.get_date_data(tomorrow_str), lines)
+    except BatchError as e:
+        await ctx.send(f"❌ Batch rejected, {e}. Nothing was changed.")
         return
     
+    part.schedule_data[tomorrow_str] = data
+    part.save_data(tomorrow_str)
+    
     embed = discord.Embed(
-        title=f"📋 Changes for Tomorrow ({tomorrow.strftime('%A, %b %d')})",
-        color=discord.Color.orange()
+        title=f"✅ {len(summary)} change(s) for Tomorrow ({tomorrow.strftime('%A, %b %d')})",
+        description="\n".join(summary),
+        color=discord.Color.green()
     )
-    
-    if data["room"]:
-        embed.add_field(name="🏫 Room", value=data["room"], inline=False)
-    
-    if data["cancellations"]:
-        cancelled_list = "\n".join([f"❌ {s}" for s in data["cancellations"]])
-        embed.add_field(name="Cancelled Classes", value=cancelled_list, inline=False)
-    
-    if data["rescheduled"]:
-        rescheduled_list = "\n".join([f"🔄 {orig} → {new_time}" for orig, (new_time, _) in data["rescheduled"].items()])
-        embed.add_field(name="Rescheduled Classes", value=rescheduled_list, inline=False)
-    
-    if data["added"]:
-        added_list = "\n".join([f"➕ {time}: {subj}" for time, subj in data["added"]])
-        embed.add_field(name="Extra Classes", value=added_list, inline=False)
-    
-    if data["notice"]:
-        embed.add_field(name="📢 Notice", value=data["notice"], inline=False)
-    
     await ctx.send(embed=embed)
 
 
+@bot.command()
+async def week(ctx):
+    """Show the next seven days with all changes applied"""
+    part = await get_partition(ctx)
+    start = tomorrow_date()
+    await send_pages(ctx, await range_pages(part, start, 7, f"🗓️ Week from {start.strftime('%A, %b %d')}"))
+
+
+@bot.command()
+async def on(ctx, *, dates: DateRangeArg):
+    """Show a date or a range of dates. Usage: !on 2025-12-01 or !on 2025-12-01..2025-12-07"""
+    part = await get_partition(ctx)
+    start, count = dates
+    await send_pages(ctx, await range_pages(part, start, count, range_title(start, count)))
+
+
+@bot.command()
+async def changes(ctx):
+    """Show all current changes for tomorrow"""
+    part = await get_partition(ctx)
+    tomorrow = tomorrow_date()
+    tomorrow_str = tomorrow.strftime("%Y-%m-%d")
+    
+    content, embed = build_changes_message(part.get_date_data(tomorrow_str), tomorrow)
+    await ctx.send(content, embed=embed)
+
+
 @bot.command()
 async def reset(ctx):
     """Reset all changes for tomorrow"""
-    tomorrow = datetime.now() + timedelta(days=1)
+    part = await get_partition(ctx)
+    tomorrow = tomorrow_date()
     tomorrow_str = tomorrow.strftime("%Y-%m-%d")
     
-    if tomorrow_str in schedule_data:
-        del schedule_data[tomorrow_str]
-        save_data()
+    if tomorrow_str in part.schedule_data:
+        del part.schedule_data[tomorrow_str]
+        part.save_data(tomorrow_str)
     
     await ctx.send(f"✅ All changes reset for tomorrow ({tomorrow.strftime('%A, %b %d')}). Routine is back to normal.")
 
@@ -597,18 +1609,88 @@ async def reset(ctx):
 @bot.command()
 async def clearall(ctx):
     """Clear ALL stored data (use with caution!)"""
-    global schedule_data
-    schedule_data = {}
-    save_data()
+    part = await get_partition(ctx)
+    await part.clear()
     await ctx.send("✅ All stored data cleared!")
 
 
+@bot.command()
+async def holidays(ctx, month: str = None):
+    """List the holidays in a month. Usage: !holidays 2025-12"""
+    part = await get_partition(ctx)
+    await ctx.send(await holidays_message(part, month))
+
+
+@bot.command()
+async def archive(ctx):
+    """Move past dates out of the live data file into the monthly archive"""
+    part = await get_partition(ctx)
+    started = time.perf_counter()
+    count = await part.archive_old_dates()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    await ctx.send(f"📦 Archived {count} past date(s) older than {RETENTION_DAYS} days ({elapsed_ms:.0f} ms)")
+
+
+@bot.command()
+@commands.has_permissions(administrator=True)
+async def stats(ctx):
+    """Show performance numbers (admins only)"""
+    uptime = timedelta(seconds=int(time.time() - telemetry.started))
+    embed = discord.Embed(
+        title="📊 Bot Performance",
+        description=f"⏱️ Up for {uptime} • {len(partitions)} partition(s) in memory",
+        color=discord.Color.dark_grey()
+    )
+    
+    busiest = sorted(telemetry.commands.items(), key=lambda item: -item[1].count)[:10]
+    if busiest:
+        lines = [
+            f"`!{name}` ×{hist.count} • p50 ≤{hist.percentile(50):g} ms • p95 ≤{hist.percentile(95):g} ms"
+            + (f" • ⚠️ {telemetry.command_errors[name]} failed" if name in telemetry.command_errors else "")
+            for name, hist in busiest
+        ]
+        embed.add_field(name="⌨️ Commands", value="\n".join(lines), inline=False)
+    
+    api_total = sum(telemetry.api_calls.values())
+    by_method = ", ".join(f"{method} {n}" for method, n in sorted(telemetry.api_calls.items())) or "none"
+    embed.add_field(
+        name="🌐 Discord API",
+        value=(
+            f"{api_total} request(s) ({by_method})\n🚦 {telemetry.rate_limits} rate limit hit(s)\n"
+            f"✏️ {telemetry.live_edits} live post edit(s), {telemetry.live_unchanged} skipped as unchanged"
+        ),
+        inline=False
+    )
+    
+    flushes, loads = telemetry.flushes, telemetry.loads
+    part = await get_partition(ctx)
+    size = telemetry.file_sizes.get(part.key)
+    on_disk = f"{size / 1024:.1f} KiB on disk" if size is not None else "not flushed yet"
+    embed.add_field(
+        name="💾 Storage",
+        value=(
+            f"{flushes.count} flush(es) • p50 ≤{flushes.percentile(50):g} ms • p95 ≤{flushes.percentile(95):g} ms\n"
+            f"{loads.count} load(s) • p50 ≤{loads.percentile(50):g} ms\n"
+            f"{STORAGE_BACKEND} • {on_disk}"
+        ),
+        inline=False
+    )
+    
+    timetables = [
+        f"{season} v{timetable.version}" + (f" • ⚠️ {len(timetable.warnings)} warning(s)" if timetable.warnings else "")
+        for season, timetable in sorted(TIMETABLES.items())
+    ]
+    embed.add_field(name="📅 Timetables", value="\n".join(timetables) or "none", inline=False)
+    
+    await ctx.send(embed=embed)
+
+
 @bot.command(name='?')
 async def help_command(ctx):
     """Show all available commands"""
     embed = discord.Embed(
         title="🤖 Routine Bot Commands",
-        description="All commands work for **TOMORROW's** schedule",
+        description="All commands work for **TOMORROW's** schedule\nMost are also available as `/` slash commands with suggestions",
         color=discord.Color.green()
     )
     
@@ -624,7 +1706,7 @@ async def help_command(ctx):
     )
     embed.add_field(
         name="❌ !cancel <search>",
-        value="Cancel a class (lazy search)\nExample: `!cancel electric` or `!cancel power`",
+        value="Cancel a class (search by name, acronym or teacher)\nExample: `!cancel electric`, `!cancel dsp` or `!cancel skr`",
         inline=False
     )
     embed.add_field(
@@ -667,6 +1749,21 @@ async def help_command(ctx):
         value="Remove holiday status from tomorrow",
         inline=False
     )
+    embed.add_field(
+        name="📦 !batch <one change per line>",
+        value="Apply several changes at once; if any line is wrong nothing is changed\nExample:\n```!batch\ncancel dsp\nroom D204\naddclass 15:00-16:00 Extra Tutorial\nnotice Bring lab coats```",
+        inline=False
+    )
+    embed.add_field(
+        name="🗓️ !week",
+        value="Show the next seven days with all changes applied",
+        inline=False
+    )
+    embed.add_field(
+        name="🗓️ !on <date|range>",
+        value="Show any date or range (up to 31 days)\nExample: `!on 2025-12-01` or `!on 2025-12-01..2025-12-07`",
+        inline=False
+    )
     embed.add_field(
         name="📋 !changes",
         value="Show all changes for tomorrow",
@@ -677,6 +1774,21 @@ async def help_command(ctx):
         value="Reset all changes for tomorrow",
         inline=False
     )
+    embed.add_field(
+        name="📅 !holidays [YYYY-MM]",
+        value="List the holidays in a month\nExample: `!holidays 2025-12`",
+        inline=False
+    )
+    embed.add_field(
+        name="📦 !archive",
+        value="Move old dates out of the live data file into the archive",
+        inline=False
+    )
+    embed.add_field(
+        name="📊 !stats",
+        value="Show bot performance numbers (admins only)",
+        inline=False
+    )
     embed.add_field(
         name="🗑️ !clearall",
         value="Clear ALL stored data (use carefully!)",
@@ -688,5 +1800,228 @@ async def help_command(ctx):
     await ctx.send(embed=embed)
 
 
+# ---------------- SLASH COMMANDS ----------------
+# Same changes as the prefix commands (through the batch operations), with
+# autocomplete answered from memory: Discord drops suggestions after 3 seconds.
+def autocomplete_view(interaction):
+    """(partition, tomorrow's DayIndex, tomorrow's overrides) without touching the disk"""
+    key = partition_key(interaction.guild_id, interaction.channel_id)
+    part = partitions.get(key)
+    if part is None:
+        part = partitions[key] = Partition(key, partition_config.get(key, {}))
+    if not part.loaded:
+        # Suggest from the timetable alone and load in the background for the command itself
+        asyncio.get_running_loop().create_task(part.ensure_loaded())
+    tomorrow = tomorrow_date()
+    data = part.schedule_data.get(tomorrow.strftime("%Y-%m-%d")) if part.loaded else None
+    return part, part.day_index(tomorrow), data or new_date_entry()
+
+def subject_choices(subjects, current):
+    for subject in subjects:
+        SEARCH_INDEX.add(subject)
+    if current.strip():
+        ranked = [subject for subject, _ in SEARCH_INDEX.search(current, subjects)]
+    else:
+        ranked = sorted(set(subjects))
+    return [app_commands.Choice(name=s[:100], value=s[:100]) for s in ranked[:25]]
+
+def time_choices(day_index, current, ranges):
+    """Tomorrow's slot times (start times, or whole ranges) whose label contains `current`"""
+    choices = []
+    seen = set()
+    for slot in day_index.slots if day_index else ():
+        start = f"{slot.start // 60:02d}:{slot.start % 60:02d}"
+        value = f"{start}-{slot.end // 60:02d}:{slot.end % 60:02d}" if ranges else start
+        label = f"{slot.time} {slot.subject}" + (f" (Group {slot.group})" if slot.group else "")
+        if value in seen or current.strip().lower() not in label.lower():
+            continue
+        seen.add(value)
+        choices.append(app_commands.Choice(name=label[:100], value=value))
+    return choices[:25]
+
+async def cancel_autocomplete(interaction, current):
+    _, day_index, data = autocomplete_view(interaction)
+    cancelled = set(data["cancellations"])
+    subjects = list(day_index.by_subject) if day_index else []
+    subjects += [subject for _, subject in data["added"]]
+    return subject_choices([s for s in subjects if s not in cancelled], current)
+
+async def uncancel_autocomplete(interaction, current):
+    _, _, data = autocomplete_view(interaction)
+    return subject_choices(data["cancellations"], current)
+
+async def start_time_autocomplete(interaction, current):
+    _, day_index, _ = autocomplete_view(interaction)
+    return time_choices(day_index, current, ranges=False)
+
+async def time_range_autocomplete(interaction, current):
+    _, day_index, _ = autocomplete_view(interaction)
+    return time_choices(day_index, current, ranges=True)
+
+async def room_autocomplete(interaction, current):
+    part, _, _ = autocomplete_view(interaction)
+    rooms = part.known_rooms() if part.loaded else sorted({DEFAULT_ROOM, part.default_room})
+    current = current.strip().lower()
+    return [app_commands.Choice(name=r, value=r) for r in rooms if current in r.lower()][:25]
+
+async def slash_partition(interaction):
+    """get_partition for a slash command, deferring the reply first when the partition still has to load
+
+    Loading can take longer than the 3 seconds Discord waits for an answer
+    (a big journal replay, the SQLite import), so the reply then comes as a followup.
+    """
+    part = partitions.get(partition_key(interaction.guild_id, interaction.channel_id))
+    if (part is None or not part.loaded) and not interaction.response.is_done():
+        await interaction.response.defer()
+    return await get_partition(interaction)
+
+async def slash_reply(interaction, content=None, **kwargs):
+    """Answer a slash command, as a followup when slash_partition deferred it (which returns the message)"""
+    if interaction.response.is_done():
+        return await interaction.followup.send(content, wait=True, **kwargs)
+    await interaction.response.send_message(content, **kwargs)
+
+async def apply_slash_change(interaction, op, arg=""):
+    """Run one batch operation on tomorrow and confirm it; invalid input gets a private reply"""
+    part = await slash_partition(interaction)
+    try:
+        summary = apply_change(part, op, arg)
+    except BatchError as e:
+        await slash_reply(interaction, f"❌ {change_error(e)}", ephemeral=True)
+        return
+    await slash_reply(interaction, summary)
+
+
+@bot.tree.command(name="routine", description="Post tomorrow's routine with @everyone")
+async def slash_routine(interaction: discord.Interaction):
+    # Loading, cleanup and posting can take longer than Discord's 3 second reply window
+    await interaction.response.defer(ephemeral=True)
+    part = await get_partition(interaction)
+    await cleanup_channel(interaction.channel, part.last_post(interaction.channel.id))
+    
+    tomorrow = tomorrow_date()
+    content, embed = build_routine_message(part, tomorrow, preview=False)
+    message = await interaction.channel.send(content, embed=embed)
+    await part.remember_post(interaction.channel.id, message.id, tomorrow.strftime("%Y-%m-%d"), content, embed)
+    await interaction.followup.send("✅ Routine posted", ephemeral=True)
+
+
+@bot.tree.command(name="test", description="Preview tomorrow's routine without @everyone")
+async def slash_test(interaction: discord.Interaction):
+    part = await slash_partition(interaction)
+    tomorrow = tomorrow_date()
+    content, embed = build_routine_message(part, tomorrow, preview=True)
+    await slash_reply(interaction, content, embed=embed)
+
+
+@bot.tree.command(name="cancel", description="Cancel one of tomorrow's classes")
+@app_commands.describe(subject="Class to cancel (name, acronym or teacher)")
+@app_commands.autocomplete(subject=cancel_autocomplete)
+async def slash_cancel(interaction: discord.Interaction, subject: str):
+    await apply_slash_change(interaction, batch_cancel, subject)
+
+
+@bot.tree.command(name="cancelall", description="Cancel all of tomorrow's classes")
+async def slash_cancelall(interaction: discord.Interaction):
+    await apply_slash_change(interaction, batch_cancelall)
+
+
+@bot.tree.command(name="uncancel", description="Restore a cancelled class")
+@app_commands.describe(subject="Cancelled class to restore")
+@app_commands.autocomplete(subject=uncancel_autocomplete)
+async def slash_uncancel(interaction: discord.Interaction, subject: str):
+    await apply_slash_change(interaction, batch_uncancel, subject)
+
+
+@bot.tree.command(name="reschedule", description="Move one of tomorrow's classes to another time")
+@app_commands.describe(
+    original_time="Start time of the class to move",
+    new_time="New time, HH:MM or HH:MM-HH:MM",
+    subject="Subject to show instead (optional)"
+)
+@app_commands.autocomplete(original_time=start_time_autocomplete, new_time=time_range_autocomplete)
+async def slash_reschedule(interaction: discord.Interaction, original_time: str, new_time: str, subject: str = ""):
+    await apply_slash_change(interaction, batch_reschedule, f"{original_time} {new_time} {subject}")
+
+
+@bot.tree.command(name="addclass", description="Add an extra class tomorrow")
+@app_commands.describe(time="HH:MM-HH:MM", subject="Subject name")
+@app_commands.autocomplete(time=time_range_autocomplete)
+async def slash_addclass(interaction: discord.Interaction, time: str, subject: str):
+    await apply_slash_change(interaction, batch_addclass, f"{time} {subject}")
+
+
+@bot.tree.command(name="room", description="Change tomorrow's room")
+@app_commands.describe(room="Room name, e.g. D204")
+@app_commands.autocomplete(room=room_autocomplete)
+async def slash_room(interaction: discord.Interaction, room: str):
+    await apply_slash_change(interaction, batch_room, room)
+
+
+@bot.tree.command(name="notice", description="Add a notice to tomorrow's routine")
+async def slash_notice(interaction: discord.Interaction, message: str):
+    await apply_slash_change(interaction, batch_notice, message)
+
+
+@bot.tree.command(name="holiday", description="Mark tomorrow as a holiday")
+async def slash_holiday(interaction: discord.Interaction, reason: str = "Holiday"):
+    await apply_slash_change(interaction, batch_holiday, reason)
+
+
+@bot.tree.command(name="unholiday", description="Remove holiday status from tomorrow")
+async def slash_unholiday(interaction: discord.Interaction):
+    await apply_slash_change(interaction, batch_unholiday)
+
+
+@bot.tree.command(name="week", description="Show the next seven days with all changes applied")
+async def slash_week(interaction: discord.Interaction):
+    part = await slash_partition(interaction)
+    start = tomorrow_date()
+    await send_pages(interaction, await range_pages(part, start, 7, f"🗓️ Week from {start.strftime('%A, %b %d')}"))
+
+
+@bot.tree.command(name="on", description="Show a date or a range of dates")
+@app_commands.describe(dates="YYYY-MM-DD or YYYY-MM-DD..YYYY-MM-DD")
+async def slash_on(interaction: discord.Interaction, dates: str):
+    part = await slash_partition(interaction)
+    try:
+        start, count = parse_date_range(dates)
+    except ValueError:
+        await slash_reply(interaction, 
+            f"❌ Use YYYY-MM-DD or YYYY-MM-DD..YYYY-MM-DD, at most {RANGE_MAX_DAYS} days", ephemeral=True
+        )
+        return
+    await send_pages(interaction, await range_pages(part, start, count, range_title(start, count)))
+
+
+@bot.tree.command(name="changes", description="Show all changes for tomorrow")
+async def slash_changes(interaction: discord.Interaction):
+    part = await slash_partition(interaction)
+    tomorrow = tomorrow_date()
+    content, embed = build_changes_message(part.get_date_data(tomorrow.strftime("%Y-%m-%d")), tomorrow)
+    await slash_reply(interaction, content, embed=embed)
+
+
+@bot.tree.command(name="reset", description="Reset all changes for tomorrow")
+async def slash_reset(interaction: discord.Interaction):
+    part = await slash_partition(interaction)
+    tomorrow = tomorrow_date()
+    tomorrow_str = tomorrow.strftime("%Y-%m-%d")
+    
+    if tomorrow_str in part.schedule_data:
+        del part.schedule_data[tomorrow_str]
+        part.save_data(tomorrow_str)
+    
+    await slash_reply(interaction, f"✅ All changes reset for tomorrow ({tomorrow.strftime('%A, %b %d')}). Routine is back to normal.")
+
+
+@bot.tree.command(name="holidays", description="List the holidays in a month")
+@app_commands.describe(month="YYYY-MM, defaults to this month")
+async def slash_holidays(interaction: discord.Interaction, month: str = None):
+    part = await slash_partition(interaction)
+    await slash_reply(interaction, await holidays_message(part, month))
+
+
 # ------------------------------------------------
-bot.run(TOKEN)
\ No newline at end of file
+if __name__ == "__main__":
+    bot.run(TOKEN)
\ No newline at end of file
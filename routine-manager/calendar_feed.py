@@ -0,0 +1,129 @@
+'''
+ICALENDAR FEEDS FOR THE ROUTINE BOT
+
+Turns a section's effective schedule (timetable plus per-date overrides) into
+.ics files that any web server can hand out as static files. The VEVENT text is
+built one date at a time, so the bot can cache it per date and only rebuild
+the dates whose overrides changed.
+'''
+
+import os
+import re
+from datetime import timedelta
+
+from timetable import class_interval, moved_slot
+
+PRODID = "-//080BELAB//Routine Bot//EN"
+
+
+def escape(text):
+    """TEXT value escaping from RFC 5545"""
+    return (text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+def fold(line):
+    """Fold a content line to 75 octets, continuation lines starting with a space"""
+    raw = line.encode("utf-8")
+    if len(raw) <= 75:
+        return line
+    parts = []
+    while raw:
+        cut = min(len(raw), 75 if not parts else 74)
+        # Don't split a multi-byte character
+        while cut < len(raw) and (raw[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(raw[:cut].decode("utf-8"))
+        raw = raw[cut:]
+    return "\r\n ".join(parts)
+
+def local_time(day, minute):
+    """Floating local date-time, e.g. 20251201T101500"""
+    return f"{day.strftime('%Y%m%d')}T{minute // 60:02d}{minute % 60:02d}00"
+
+def slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+def vevent(uid, dtstamp, start, end, summary, location=None, description=None, cancelled=False):
+    lines = ["BEGIN:VEVENT", f"UID:{uid}", f"DTSTAMP:{dtstamp}"]
+    if isinstance(start, str):
+        lines += [f"DTSTART:{start}", f"DTEND:{end}"]
+    else:
+        # All-day event: start/end are dates, the end exclusive
+        lines += [f"DTSTART;VALUE=DATE:{start.strftime('%Y%m%d')}", f"DTEND;VALUE=DATE:{end.strftime('%Y%m%d')}"]
+    lines.append(f"SUMMARY:{escape(summary)}")
+    if location:
+        lines.append(f"LOCATION:{escape(location)}")
+    if description:
+        lines.append(f"DESCRIPTION:{escape(description)}")
+    if cancelled:
+        lines.append("STATUS:CANCELLED")
+    lines.append("END:VEVENT")
+    return "\r\n".join(fold(line) for line in lines) + "\r\n"
+
+def date_events(feed, day, slots, data, room, dtstamp):
+    """VEVENT text for one date of one feed
+
+    `slots` are the timetable slots the feed's students attend that day and
+    `data` the date's overrides ({cancellations, rescheduled, added, ...}).
+    """
+    date_str = day.strftime("%Y-%m-%d")
+    uid_prefix = f"{date_str}@{feed}"
+
+    if data["is_holiday"]:
+        return vevent(f"holiday-{uid_prefix}", dtstamp, day, day + timedelta(days=1),
+                      f"🎉 {data['holiday_reason'] or 'Holiday'}")
+
+    notice = data["notice"]
+    events = []
+    for slot in slots:
+        uid = f"{slot.start}-{slot.group or 'all'}-{slug(slot.subject)}-{uid_prefix}"
+        summary = slot.subject + (f" (Group {slot.group})" if slot.group else "")
+        start, end = slot.start, slot.end
+        description = notice
+        entry = data["rescheduled"].get(slot.subject)
+        if entry and moved_slot(slots, slot.subject, entry) == slot:
+            # Same UID, new time: calendar apps move the existing event
+            new_time, new_name = entry[0], entry[1]
+            try:
+                start, end = class_interval(new_time, slot.end - slot.start)
+            except ValueError:
+                pass  # unreadable old entry: leave it where it was
+            summary = new_name + (f" (Group {slot.group})" if slot.group else "")
+            description = "\n".join(filter(None, [f"Rescheduled from {slot.time}", notice]))
+        events.append(vevent(
+            uid, dtstamp, local_time(day, start), local_time(day, end), summary,
+            location=room, description=description, cancelled=slot.subject in data["cancellations"]
+        ))
+
+    for i, (time, subject) in enumerate(data["added"]):
+        try:
+            start, end = class_interval(time)
+        except ValueError:
+            continue
+        events.append(vevent(
+            f"added-{i}-{slug(subject)}-{uid_prefix}", dtstamp, local_time(day, start), local_time(day, end),
+            subject, location=room, description="\n".join(filter(None, ["Extra class", notice])),
+            cancelled=subject in data["cancellations"]
+        ))
+    return "".join(events)
+
+def build_calendar(name, chunks):
+    """A whole VCALENDAR from per-date event chunks"""
+    header = "\r\n".join([
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        fold(f"X-WR-CALNAME:{escape(name)}"),
+    ]) + "\r\n"
+    return header + "".join(chunks) + "END:VCALENDAR\r\n"
+
+def write_feeds(feeds):
+    """Write {path: text} atomically, so a web server never hands out half a file"""
+    for path, text in feeds.items():
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_file = path + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        os.replace(tmp_file, path)
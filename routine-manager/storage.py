@@ -0,0 +1,394 @@
+'''
+STORAGE BACKENDS FOR THE ROUTINE BOT
+
+Every backend keeps the same per-date entries the bot works with
+({cancellations, rescheduled, added, room, notice, is_holiday, holiday_reason})
+and exposes the same methods, so bot.py doesn't care which one is in use.
+All methods are blocking and are meant to run on the bot's persist executor.
+'''
+
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import threading
+
+
+def new_date_entry():
+    """A date with no changes from the regular routine"""
+    return {
+        "cancellations": [],
+        "rescheduled": {},
+        "added": [],
+        "room": None,
+        "notice": None,
+        "is_holiday": False,
+        "holiday_reason": None
+    }
+
+
+# ---------------- JSON (snapshot + journal + archive) ----------------
+class JsonStore:
+    """routine_data.json snapshot, an append-only journal and gzip monthly archives"""
+
+    def __init__(self, storage_file, journal_file, archive_dir, meta_file, compact_every=200):
+        self.storage_file = storage_file
+        self.journal_file = journal_file
+        self.archive_dir = archive_dir
+        self.meta_file = meta_file  # small bookkeeping values that aren't per-date
+        self.compact_every = compact_every  # journal records before they get folded into the snapshot
+        self.journal_records = 0
+        self.archive_cache = {}  # {"YYYY-MM": {date_str: data}}, filled on demand
+
+    def _read_journal(self):
+        """Yield journal records, stopping at a torn (half-written) last line
+
+        The torn tail is cut off the file, so the next write() starts on a
+        fresh line instead of being glued onto the fragment.
+        """
+        good = 0  # byte offset just past the last whole record
+        torn = False
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("no line end")
+                    record = json.loads(line)
+                except ValueError:
+                    print(f"Ignoring torn journal record: {line[:60]!r}")
+                    torn = True
+                    break
+                good += len(line)
+                yield record
+        if torn:
+            os.truncate(self.journal_file, good)
+
+    def load(self, cutoff):
+        """Load the snapshot file and replay the journal on top"""
+        try:
+            if os.path.exists(self.storage_file):
+                with open(self.storage_file, 'r') as f:
+                    data = json.load(f)
+            else:
+                data = {}
+        except Exception as e:
+            print(f"Error loading data: {e}")
+            data = {}
+
+        self.journal_records = 0
+        try:
+            if os.path.exists(self.journal_file):
+                for record in self._read_journal():
+                    if record["data"] is None:
+                        data.pop(record["date"], None)
+                    else:
+                        data[record["date"]] = record["data"]
+                    self.journal_records += 1
+        except Exception as e:
+            print(f"Error replaying journal: {e}")
+
+        if self.journal_records >= self.compact_every:
+            self.compact(data)
+        return data
+
+    def write(self, changes):
+        """Append one record per changed date ({date: data or None}) in a single write"""
+        lines = [
+            json.dumps({"date": d, "data": data}, separators=(',', ':')) + "\n"
+            for d, data in changes.items()
+        ]
+        if not lines:
+            return
+        with open(self.journal_file, 'a') as f:
+            f.write("".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_records += len(lines)
+
+    def should_compact(self, pending):
+        return self.journal_records + pending >= self.compact_every
+
+    def compact(self, snapshot):
+        """Fold the journal into a fresh snapshot (atomic replace) and truncate it"""
+        tmp_file = self.storage_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(snapshot, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.storage_file)
+        # Records are whole-date overwrites, so replaying a journal that
+        # survived a crash right here on top of the new snapshot is harmless
+        open(self.journal_file, 'w').close()
+        self.journal_records = 0
+
+    def _segment_path(self, month):
+        return os.path.join(self.archive_dir, f"{month}.json.gz")
+
+    def _read_segment(self, month):
+        path = self._segment_path(month)
+        if not os.path.exists(path):
+            return {}
+        with gzip.open(path, 'rt') as f:
+            return json.load(f)
+
+    def _load_segment(self, month):
+        """Load one month ("YYYY-MM") of archived dates, only when something asks for it"""
+        if month not in self.archive_cache:
+            try:
+                self.archive_cache[month] = self._read_segment(month)
+            except Exception as e:
+                print(f"Error loading archive {month}: {e}")
+                return {}
+        return self.archive_cache[month]
+
+    def load_archived(self, date_str):
+        return self._load_segment(date_str[:7]).get(date_str)
+
+    def archive(self, groups):
+        """Merge dates ({month: {date: data}}) into their monthly segments, dropping no-change entries"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        empty = new_date_entry()
+        for month, entries in groups.items():
+            segment = self._read_segment(month)
+            segment.update(entries)
+            segment = {d: segment[d] for d in sorted(segment) if segment[d] != empty}
+            tmp_file = self._segment_path(month) + ".tmp"
+            with gzip.open(tmp_file, 'wt') as f:
+                json.dump(segment, f, separators=(',', ':'))
+            os.replace(tmp_file, self._segment_path(month))
+            self.archive_cache.pop(month, None)
+
+    def holidays_between(self, start, end):
+        """Archived holidays in [start, end] as {date: reason}; the hot data is the caller's"""
+        holidays = {}
+        month = start[:7]
+        while month <= end[:7]:
+            for d, data in self._load_segment(month).items():
+                if start <= d <= end and data["is_holiday"]:
+                    holidays[d] = data["holiday_reason"]
+            year, mon = int(month[:4]), int(month[5:])
+            month = f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+        return holidays
+
+    def all_dates(self):
+        """Everything stored, hot and archived (used for migrations)"""
+        data = {}
+        if os.path.isdir(self.archive_dir):
+            for name in sorted(os.listdir(self.archive_dir)):
+                if name.endswith(".json.gz"):
+                    data.update(self._read_segment(name[:-len(".json.gz")]))
+        data.update(self.load(cutoff=""))
+        return data
+
+    def clear(self):
+        self.compact({})
+        self.archive_cache.clear()
+        shutil.rmtree(self.archive_dir, ignore_errors=True)
+
+    def size_bytes(self):
+        """Size of the hot files (snapshot + journal)"""
+        return sum(os.path.getsize(p) for p in (self.storage_file, self.journal_file) if os.path.exists(p))
+
+    def _read_meta(self):
+        if not os.path.exists(self.meta_file):
+            return {}
+        with open(self.meta_file, 'r') as f:
+            return json.load(f)
+
+    def get_meta(self, key, default=None):
+        return self._read_meta().get(key, default)
+
+    def set_meta(self, key, value):
+        meta = self._read_meta()
+        meta[key] = value
+        tmp_file = self.meta_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_file, self.meta_file)
+
+    def close(self):
+        pass
+
+
+# ---------------- SQLITE ----------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS days (
+    guild TEXT NOT NULL,
+    date TEXT NOT NULL,
+    room TEXT,
+    notice TEXT,
+    is_holiday INTEGER NOT NULL DEFAULT 0,
+    holiday_reason TEXT,
+    PRIMARY KEY (guild, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS days_by_holiday ON days (guild, is_holiday, date);
+
+-- kind: 'cancel' (subject), 'reschedule' (subject -> time, new_name, from original_time), 'add' (time, subject)
+CREATE TABLE IF NOT EXISTS changes (
+    guild TEXT NOT NULL,
+    date TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    time TEXT,
+    new_name TEXT,
+    original_time TEXT
+);
+CREATE INDEX IF NOT EXISTS changes_by_date ON changes (guild, date);
+
+CREATE TABLE IF NOT EXISTS meta (
+    guild TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (guild, key)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteStore:
+    """Schedule overrides as rows keyed by (guild, date) in a WAL-mode SQLite database"""
+
+    def __init__(self, path, guild="default"):
+        self.path = path
+        self.guild = str(guild)
+        # Writes come from the persist worker, archived lookups from the event loop
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        # Databases from before reschedules remembered which slot they moved
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(changes)")]
+        if "original_time" not in columns:
+            self.db.execute("ALTER TABLE changes ADD COLUMN original_time TEXT")
+
+    def _entries(self, where, params):
+        """Assemble per-date entries from the rows matching a WHERE clause"""
+        data = {}
+        for d, room, notice, is_holiday, reason in self.db.execute(
+            f"SELECT date, room, notice, is_holiday, holiday_reason FROM days WHERE {where}", params
+        ):
+            entry = new_date_entry()
+            entry.update(room=room, notice=notice, is_holiday=bool(is_holiday), holiday_reason=reason)
+            data[d] = entry
+        for d, kind, subject, time, new_name, original_time in self.db.execute(
+            f"SELECT date, kind, subject, time, new_name, original_time FROM changes WHERE {where} ORDER BY date, position", params
+        ):
+            entry = data.get(d)
+            if entry is None:
+                continue
+            if kind == "cancel":
+                entry["cancellations"].append(subject)
+            elif kind == "reschedule":
+                entry["rescheduled"][subject] = [time, new_name] + ([original_time] if original_time else [])
+            elif kind == "add":
+                entry["added"].append([time, subject])
+        return data
+
+    def load(self, cutoff):
+        """Only dates inside the retention window; older ones are read on demand"""
+        with self.lock:
+            return self._entries("guild = ? AND date >= ?", (self.guild, cutoff))
+
+    def load_archived(self, date_str):
+        with self.lock:
+            return self._entries("guild = ? AND date = ?", (self.guild, date_str)).get(date_str)
+
+    def _write_rows(self, changes):
+        for d, data in changes.items():
+            self.db.execute("DELETE FROM changes WHERE guild = ? AND date = ?", (self.guild, d))
+            if data is None:
+                self.db.execute("DELETE FROM days WHERE guild = ? AND date = ?", (self.guild, d))
+                continue
+            self.db.execute(
+                "INSERT INTO days (guild, date, room, notice, is_holiday, holiday_reason) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (guild, date) DO UPDATE SET room = excluded.room, notice = excluded.notice, "
+                "is_holiday = excluded.is_holiday, holiday_reason = excluded.holiday_reason",
+                (self.guild, d, data["room"], data["notice"], int(data["is_holiday"]), data["holiday_reason"])
+            )
+            rows = [("cancel", subject, None, None, None) for subject in data["cancellations"]]
+            rows += [("reschedule", subject, entry[0], entry[1], entry[2] if len(entry) > 2 else None)
+                     for subject, entry in data["rescheduled"].items()]
+            rows += [("add", subject, t, None, None) for t, subject in data["added"]]
+            self.db.executemany(
+                "INSERT INTO changes (guild, date, kind, position, subject, time, new_name, original_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.guild, d, kind, i, subject, t, name, original) for i, (kind, subject, t, name, original) in enumerate(rows)]
+            )
+
+    def write(self, changes):
+        """Upsert each changed date ({date: data or None}) in one transaction"""
+        if not changes:
+            return
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_rows(changes)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def should_compact(self, pending):
+        return False
+
+    def compact(self, snapshot):
+        """Rows are written in place, so compaction only folds the WAL back into the database"""
+        with self.lock:
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def archive(self, groups):
+        """Old rows simply stay where they are; only drop the ones that hold no changes"""
+        empty = new_date_entry()
+        self.write({
+            d: (None if data == empty else data)
+            for entries in groups.values()
+            for d, data in entries.items()
+        })
+
+    def holidays_between(self, start, end):
+        with self.lock:
+            return dict(self.db.execute(
+                "SELECT date, holiday_reason FROM days WHERE guild = ? AND is_holiday = 1 AND date BETWEEN ? AND ?",
+                (self.guild, start, end)
+            ))
+
+    def all_dates(self):
+        with self.lock:
+            return self._entries("guild = ?", (self.guild,))
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM changes WHERE guild = ?", (self.guild,))
+            self.db.execute("DELETE FROM days WHERE guild = ?", (self.guild,))
+
+    def size_bytes(self):
+        """Size of the whole database file and its WAL (shared by every guild)"""
+        return sum(os.path.getsize(p) for p in (self.path, self.path + "-wal") if os.path.exists(p))
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT value FROM meta WHERE guild = ? AND key = ?", (self.guild, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO meta (guild, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (guild, key) DO UPDATE SET value = excluded.value",
+                (self.guild, key, json.dumps(value))
+            )
+
+    def import_from(self, other):
+        """One-time migration: copy every date from another store"""
+        data = other.all_dates()
+        self.write(data)
+        self.set_meta("imported", True)
+        return len(data)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,128 @@
+'''
+PERFORMANCE TELEMETRY FOR THE ROUTINE BOT
+
+Fixed-bucket histograms and counters cheap enough to update on every command
+(a bisect and a few integer adds), readable from !stats and exportable in the
+Prometheus text format.
+'''
+
+import bisect
+import time
+
+# Upper bounds in milliseconds; anything slower lands in the +Inf bucket
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Counts of observations per latency bucket, plus their sum"""
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value_ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile (inf when it's past the last one)"""
+        if not self.count:
+            return 0.0
+        rank = self.count * pct / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else float("inf")
+        return float("inf")
+
+
+class Telemetry:
+    """Everything !stats shows: command latency, Discord API use, persistence timings"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.commands = {}  # {command name: Histogram}
+        self.command_errors = {}  # {command name: count}
+        self.api_calls = {}  # {HTTP method: count}
+        self.rate_limits = 0  # 429 responses Discord sent back
+        self.live_edits = 0  # live routine posts edited
+        self.live_unchanged = 0  # live post updates dropped because the render didn't change
+        self.loads = Histogram()
+        self.flushes = Histogram()
+        self.file_sizes = {}  # {partition key: bytes on disk after the last flush}
+
+    def observe_command(self, name, elapsed_ms, failed):
+        histogram = self.commands.get(name)
+        if histogram is None:
+            histogram = self.commands[name] = Histogram()
+        histogram.observe(elapsed_ms)
+        if failed:
+            self.command_errors[name] = self.command_errors.get(name, 0) + 1
+
+    def count_api_call(self, method):
+        self.api_calls[method] = self.api_calls.get(method, 0) + 1
+
+    def observe_flush(self, key, elapsed_ms, size):
+        self.flushes.observe(elapsed_ms)
+        if size is not None:
+            self.file_sizes[key] = size
+
+    def render_prometheus(self):
+        """Current values in the Prometheus text exposition format"""
+        lines = []
+
+        def histogram(name, hist, labels=""):
+            prefix = labels + "," if labels else ""
+            suffix = "{" + labels + "}" if labels else ""
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS_MS, hist.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {hist.count}')
+            lines.append(f"{name}_sum{suffix} {hist.total:.3f}")
+            lines.append(f"{name}_count{suffix} {hist.count}")
+
+        lines += ["# HELP routine_command_latency_ms Command handler latency.",
+                  "# TYPE routine_command_latency_ms histogram"]
+        for name, hist in sorted(self.commands.items()):
+            histogram("routine_command_latency_ms", hist, f'command="{name}"')
+
+        lines += ["# HELP routine_command_errors_total Commands that raised.",
+                  "# TYPE routine_command_errors_total counter"]
+        for name, n in sorted(self.command_errors.items()):
+            lines.append(f'routine_command_errors_total{{command="{name}"}} {n}')
+
+        lines += ["# HELP routine_discord_api_calls_total Discord REST requests.",
+                  "# TYPE routine_discord_api_calls_total counter"]
+        for method, n in sorted(self.api_calls.items()):
+            lines.append(f'routine_discord_api_calls_total{{method="{method}"}} {n}')
+
+        lines += ["# HELP routine_discord_rate_limits_total 429 responses from Discord.",
+                  "# TYPE routine_discord_rate_limits_total counter",
+                  f"routine_discord_rate_limits_total {self.rate_limits}"]
+
+        lines += ["# HELP routine_live_post_updates_total Live routine post updates, edited or skipped as unchanged.",
+                  "# TYPE routine_live_post_updates_total counter",
+                  f'routine_live_post_updates_total{{result="edited"}} {self.live_edits}',
+                  f'routine_live_post_updates_total{{result="unchanged"}} {self.live_unchanged}']
+
+        lines += ["# HELP routine_load_latency_ms Partition data load time.",
+                  "# TYPE routine_load_latency_ms histogram"]
+        histogram("routine_load_latency_ms", self.loads)
+        lines += ["# HELP routine_flush_latency_ms Time to write a batch of changes.",
+                  "# TYPE routine_flush_latency_ms histogram"]
+        histogram("routine_flush_latency_ms", self.flushes)
+
+        lines += ["# HELP routine_data_bytes Stored data size per partition.",
+                  "# TYPE routine_data_bytes gauge"]
+        for key, size in sorted(self.file_sizes.items()):
+            lines.append(f'routine_data_bytes{{partition="{key}"}} {size}')
+
+        lines += ["# HELP routine_uptime_seconds Seconds since the bot started.",
+                  "# TYPE routine_uptime_seconds gauge",
+                  f"routine_uptime_seconds {time.time() - self.started:.0f}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,77 @@
+'''
+REGRESSION TESTS FOR THE BOT'S COMMAND LOGIC
+
+    python -m pytest -q test_bot.py     (or: python -m unittest test_bot)
+'''
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import bot
+from storage import new_date_entry
+
+TUESDAY = datetime(2025, 12, 2)
+
+
+class SubjectPickTest(unittest.TestCase):
+    def setUp(self):
+        # Tuesday has Switchgear & Protection as theory and as group B's practical
+        self.part = bot.Partition("1", {})
+        self.addCleanup(self.part.executor.shutdown)
+
+    def cancel(self, query, data=None):
+        data = data or new_date_entry()
+        bot.batch_cancel(self.part, TUESDAY, data, query)
+        return data["cancellations"]
+
+    def test_full_name_picks_the_theory_class(self):
+        self.assertEqual(self.cancel("Switchgear & Protection (Akhm)"), ["Switchgear & Protection (Akhm)"])
+        self.assertEqual(self.cancel("switchgear & protection (akhm)"), ["Switchgear & Protection (Akhm)"])
+
+    def test_teacher_code_settles_a_shared_word(self):
+        self.assertEqual(self.cancel("switchgear akhm"), ["Switchgear & Protection (Akhm)"])
+
+    def test_shared_word_alone_is_ambiguous(self):
+        with self.assertRaises(bot.BatchError):
+            self.cancel("switchgear")
+
+    def test_uncancel_after_cancelall(self):
+        data = new_date_entry()
+        bot.batch_cancelall(self.part, TUESDAY, data, "")
+        bot.batch_uncancel(self.part, TUESDAY, data, "Switchgear & Protection (Akhm)")
+        bot.batch_uncancel(self.part, TUESDAY, data, "switchgear gdj")
+        self.assertNotIn("Switchgear & Protection (Akhm)", data["cancellations"])
+        self.assertNotIn("Switchgear & Protection A/B (GDJ+BS)", data["cancellations"])
+
+
+class SqliteImportTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.data_dir = os.path.join(self.dir.name, "guild")
+
+    def open_store(self, backend):
+        part = bot.Partition("1", {"data_dir": self.data_dir})
+        self.addCleanup(part.executor.shutdown)
+        with mock.patch.object(bot, "STORAGE_BACKEND", backend), \
+                mock.patch.object(bot, "SQLITE_FILE", os.path.join(self.dir.name, "routine_data.db")):
+            store = part.open_store()
+        self.addCleanup(store.close)
+        return store
+
+    def test_journal_only_store_is_imported(self):
+        data = new_date_entry()
+        data["room"] = "D204"
+        # A handful of changes: still all in the journal, no snapshot yet
+        self.open_store("json").write({"2025-12-02": data})
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, bot.STORAGE_FILE)))
+
+        loaded = self.open_store("sqlite").load(cutoff="")
+        self.assertEqual(loaded["2025-12-02"]["room"], "D204")
+
+
+if __name__ == "__main__":
+    unittest.main()
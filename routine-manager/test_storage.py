@@ -0,0 +1,58 @@
+'''
+REGRESSION TESTS FOR THE STORAGE BACKENDS
+
+    python -m pytest -q test_storage.py     (or: python -m unittest test_storage)
+'''
+
+import os
+import tempfile
+import unittest
+
+from storage import JsonStore, new_date_entry
+
+
+def entry(notice):
+    data = new_date_entry()
+    data["notice"] = notice
+    return data
+
+
+class TornJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def store(self):
+        path = lambda name: os.path.join(self.dir.name, name)
+        return JsonStore(path("routine_data.json"), path("routine_data.journal"),
+                         path("archive"), path("routine_meta.json"))
+
+    def test_writes_after_a_torn_record_survive_reload(self):
+        store = self.store()
+        store.write({"2025-12-01": entry("one")})
+        # A crash in the middle of an append leaves half a line behind
+        with open(store.journal_file, 'a') as f:
+            f.write('{"date":"2025-12-02","da')
+
+        store = self.store()
+        self.assertEqual(list(store.load(cutoff="")), ["2025-12-01"])
+        store.write({"2025-12-03": entry("three")})
+        store.write({"2025-12-04": entry("four")})
+
+        data = self.store().load(cutoff="")
+        self.assertEqual(sorted(data), ["2025-12-01", "2025-12-03", "2025-12-04"])
+        self.assertEqual(data["2025-12-04"]["notice"], "four")
+
+    def test_torn_tail_is_cut_off_the_file(self):
+        store = self.store()
+        store.write({"2025-12-01": entry("one")})
+        good_size = os.path.getsize(store.journal_file)
+        with open(store.journal_file, 'a') as f:
+            f.write('{"date":')
+
+        self.store().load(cutoff="")
+        self.assertEqual(os.path.getsize(store.journal_file), good_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+'''
+REGRESSION TESTS FOR THE TIMETABLE HELPERS
+
+    python -m pytest -q test_timetable.py     (or: python -m unittest test_timetable)
+'''
+
+import unittest
+
+from storage import new_date_entry
+from timetable import compile_day, effective_schedule
+
+
+class RescheduleTest(unittest.TestCase):
+    def setUp(self):
+        # The same subject twice in a day, like Sunday's Project Engineering
+        self.day = compile_day({"theory": (("10:15-11:05", "Maths"), ("11:45", "Project"), ("13:35", "Project")), "practical": {}})
+
+    def bookings(self, entry):
+        data = new_date_entry()
+        data["rescheduled"]["Project"] = entry
+        return [(b.time, b.kind) for b in effective_schedule(self.day, data).bookings if b.source == "Project"]
+
+    def test_moves_only_the_slot_it_was_asked_to(self):
+        second = [slot for slot in self.day.slots if slot.subject == "Project"][1]
+        self.assertEqual(self.bookings(["16:00", "Project", second.time]), [
+            (self.day.slots[1].time, "class"), (second.time, "moved"), ("16:00", "rescheduled")
+        ])
+
+    def test_entry_without_original_time_moves_the_first_slot_once(self):
+        kinds = [kind for _, kind in self.bookings(["16:00", "Project"])]
+        self.assertEqual(kinds, ["moved", "class", "rescheduled"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,338 @@
+'''
+TIMETABLE FILES FOR THE ROUTINE BOT
+
+Each season's weekly timetable lives in its own JSON file, named after the
+season (timetables/winter.json):
+
+    {
+        "version": 3,
+        "room": "C303",
+        "days": {
+            "sunday": {
+                "theory": [["10:15–11:45", "Digital Signal Processing (SPP)"], ...],
+                "practical": {"A": [["15:15–16:55", "Power Electronics Lab (SA+RS)"]], "B": []}
+            },
+            ...
+        }
+    }
+
+A file is parsed and compiled in full before the bot swaps it in. A malformed
+file is rejected as a whole. Overlapping slots are loaded but reported as warnings.
+'''
+
+import bisect
+import json
+import os
+import re
+from collections import namedtuple
+
+WEEKDAYS = ("sunday", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday")
+DEFAULT_CLASS_MINUTES = 50  # length of a class given only a start time
+END_OF_DAY = 24 * 60
+BREAK_SUBJECTS = {"break"}  # slots that other classes may be moved into
+
+# One class occurrence; start/end are minutes since midnight, group is None for theory
+Slot = namedtuple("Slot", ["start", "end", "time", "subject", "group"])
+
+# Per (season, weekday) lookup tables
+DayIndex = namedtuple("DayIndex", ["slots", "starts", "by_start", "by_subject", "by_group"])
+
+# One loaded file: `routine` is the ROUTINES-shaped {weekday: {theory, practical}}
+# with tuples in place of lists, `days` the compiled {weekday: DayIndex}
+Timetable = namedtuple("Timetable", ["season", "version", "room", "routine", "days", "warnings", "path", "mtime"])
+
+# One entry of a date's effective schedule. `kind` is "class", "cancelled",
+# "moved" (rescheduled away; `note` holds the new time), "rescheduled" (moved
+# here; `note` holds the old time) or "added". `source` is the timetable subject
+# a rescheduled entry came from, otherwise the subject itself.
+Booking = namedtuple("Booking", ["start", "end", "time", "subject", "group", "kind", "note", "source"])
+
+# A date's bookings in time order plus, per group, an IntervalTree of the ones
+# taking up time (None holds every group, other keys theory plus that group)
+DaySchedule = namedtuple("DaySchedule", ["bookings", "trees"])
+
+ACTIVE_KINDS = {"class", "rescheduled", "added"}
+
+CLOCK_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*$")
+
+
+class TimetableError(ValueError):
+    """A timetable file that can't be loaded"""
+
+
+def parse_clock(text):
+    """Parse "HH:MM" into minutes since midnight"""
+    match = CLOCK_RE.match(text)
+    if not match:
+        raise ValueError(f"'{text}' is not a HH:MM time")
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if hours > 23 or minutes > 59:
+        raise ValueError(f"'{text}' is not a valid time of day")
+    return hours * 60 + minutes
+
+def parse_time_range(text):
+    """Parse "10:15–11:05" (or a single "10:15") into (start, end) minutes"""
+    parts = re.split(r"\s*[–-]\s*", text.strip())
+    if len(parts) == 1:
+        start = parse_clock(parts[0])
+        return start, start
+    if len(parts) != 2:
+        raise ValueError(f"'{text}' is not a time range")
+    start, end = parse_clock(parts[0]), parse_clock(parts[1])
+    if end <= start:
+        raise ValueError(f"'{text}' ends before it starts")
+    return start, end
+
+def class_interval(text, duration=DEFAULT_CLASS_MINUTES):
+    """(start, end) of "HH:MM-HH:MM", or of "HH:MM" lasting `duration` minutes; raises ValueError"""
+    start, end = parse_time_range(text)
+    return (start, end) if end > start else (start, start + duration)
+
+def compile_day(routine_data):
+    """Compile one weekday's theory/practical lists into a DayIndex"""
+    slots = []
+    for time, subject in routine_data["theory"]:
+        slots.append(Slot(*parse_time_range(time), time, subject, None))
+    for group, classes in routine_data["practical"].items():
+        for time, subject in classes:
+            slots.append(Slot(*parse_time_range(time), time, subject, group))
+
+    by_start, by_subject, by_group = {}, {}, {}
+    # Insertion order (theory before practicals) is the order lookups prefer
+    for slot in slots:
+        by_start.setdefault(slot.start, []).append(slot)
+        by_subject.setdefault(slot.subject, []).append(slot)
+        by_group.setdefault(slot.group, []).append(slot)
+
+    slots.sort(key=lambda slot: (slot.start, slot.group or ""))
+    return DayIndex(
+        slots=tuple(slots),
+        starts=tuple(slot.start for slot in slots),
+        by_start={k: tuple(v) for k, v in by_start.items()},
+        by_subject={k: tuple(v) for k, v in by_subject.items()},
+        by_group={k: tuple(v) for k, v in by_group.items()},
+    )
+
+def compile_routines(routines):
+    """Compile every season/weekday of a ROUTINES-shaped dict"""
+    return {
+        (season, weekday): compile_day(routine_data)
+        for season, days in routines.items()
+        for weekday, routine_data in days.items()
+    }
+
+def find_slot(day_index, minute):
+    """Slot starting at `minute`, else the latest one running through it (theory first)"""
+    exact = day_index.by_start.get(minute)
+    if exact:
+        return exact[0]
+    i = bisect.bisect_right(day_index.starts, minute)
+    while i > 0:
+        i -= 1
+        slot = day_index.slots[i]
+        if slot.start <= minute < slot.end:
+            return slot
+    return None
+
+
+class IntervalTree:
+    """Static interval tree over [start, end) bookings, answering overlap queries in O(log n + k)
+
+    The tree is implicit: the items are sorted by start and every node is the
+    middle of its range, annotated with the largest end in its subtree.
+    """
+    __slots__ = ("items", "max_end")
+
+    def __init__(self, items):
+        self.items = tuple(sorted(items, key=lambda item: (item.start, item.end)))
+        self.max_end = [0] * len(self.items)
+        self._build(0, len(self.items))
+
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return 0
+        mid = (lo + hi) // 2
+        self.max_end[mid] = max(self.items[mid].end, self._build(lo, mid), self._build(mid + 1, hi))
+        return self.max_end[mid]
+
+    def overlapping(self, start, end):
+        """Items overlapping [start, end), in time order"""
+        found = []
+        self._query(0, len(self.items), start, end, found)
+        return found
+
+    def _query(self, lo, hi, start, end, found):
+        if lo >= hi:
+            return
+        mid = (lo + hi) // 2
+        if self.max_end[mid] <= start:
+            return  # everything below here ends too early
+        self._query(lo, mid, start, end, found)
+        item = self.items[mid]
+        if item.start < end:
+            if item.end > start:
+                found.append(item)
+            self._query(mid + 1, hi, start, end, found)
+
+
+def moved_slot(slots, subject, entry):
+    """The slot a reschedule entry ([new_time, new_name, original_time]) moved
+
+    Entries are keyed by subject, so a subject taught twice that day is told
+    apart by the original slot time; older entries without one moved the first.
+    """
+    candidates = [slot for slot in slots if slot.subject == subject]
+    if len(entry) > 2:
+        for slot in candidates:
+            if slot.time == entry[2]:
+                return slot
+    return candidates[0] if candidates else None
+
+def effective_schedule(day_index, data):
+    """Merge a weekday's slots with a date's overrides ({cancellations, rescheduled, added, ...})"""
+    cancelled = set(data["cancellations"])
+    slots = day_index.slots if day_index else ()
+    moves = {subject: (moved_slot(slots, subject, entry), entry) for subject, entry in data["rescheduled"].items()}
+    moved = {slot: entry[0] for slot, entry in moves.values() if slot}
+
+    bookings = []
+    for slot in slots:
+        if slot.subject in cancelled:
+            bookings.append(Booking(slot.start, slot.end, slot.time, slot.subject, slot.group, "cancelled", None, slot.subject))
+        elif slot in moved:
+            bookings.append(Booking(slot.start, slot.end, slot.time, slot.subject, slot.group, "moved", moved[slot], slot.subject))
+        else:
+            bookings.append(Booking(slot.start, slot.end, slot.time, slot.subject, slot.group, "class", None, slot.subject))
+
+    for subject, (slot, entry) in moves.items():
+        if subject in cancelled:
+            continue
+        new_time, new_name = entry[0], entry[1]
+        try:
+            start, end = class_interval(new_time, slot.end - slot.start if slot else DEFAULT_CLASS_MINUTES)
+        except ValueError:
+            start = end = END_OF_DAY  # unreadable old entry: list it last, blocking nothing
+        bookings.append(Booking(
+            start, end, new_time, new_name, slot.group if slot else None,
+            "rescheduled", slot.time if slot else None, subject
+        ))
+
+    for time, subject in data["added"]:
+        try:
+            start, end = class_interval(time)
+        except ValueError:
+            start = end = END_OF_DAY
+        kind = "cancelled" if subject in cancelled else "added"
+        bookings.append(Booking(start, end, time, subject, None, kind, None, subject))
+
+    bookings.sort(key=lambda b: (b.start, b.group or "", b.end))
+    active = [b for b in bookings if b.kind in ACTIVE_KINDS and b.subject.lower() not in BREAK_SUBJECTS]
+    groups = {b.group for b in active if b.group}
+    trees = {None: IntervalTree(active)}
+    for group in groups:
+        trees[group] = IntervalTree([b for b in active if b.group is None or b.group == group])
+    return DaySchedule(tuple(bookings), trees)
+
+def find_clashes(schedule, start, end, group, moving=None):
+    """Bookings a class in [start, end) for `group` (None: everyone) would run into
+
+    `moving` is the subject being rescheduled, whose own bookings don't count.
+    """
+    tree = schedule.trees.get(group) if group else schedule.trees[None]
+    if tree is None:
+        # The group has nothing of its own that day, so only theory can clash
+        clashes = [b for b in schedule.trees[None].overlapping(start, end) if b.group is None]
+    else:
+        clashes = tree.overlapping(start, end)
+    return [b for b in clashes if b.source != moving]
+
+def find_overlaps(day_index):
+    """Pairs of slots that run at the same time for the same students (theory clashes with every group)"""
+    clashes = []
+    running = []
+    for slot in day_index.slots:
+        running = [other for other in running if other.end > slot.start]
+        for other in running:
+            if other.group is None or slot.group is None or other.group == slot.group:
+                clashes.append((other, slot))
+        running.append(slot)
+    return clashes
+
+
+# ---------------- LOADING ----------------
+def _classes(value, where):
+    """Validate a list of [time, subject] pairs into a tuple of tuples"""
+    if not isinstance(value, list):
+        raise TimetableError(f"{where}: expected a list of [time, subject] pairs")
+    classes = []
+    for i, pair in enumerate(value, 1):
+        if (not isinstance(pair, list) or len(pair) != 2
+                or not all(isinstance(item, str) and item.strip() for item in pair)):
+            raise TimetableError(f"{where} #{i}: expected [time, subject], got {pair!r}")
+        try:
+            parse_time_range(pair[0])
+        except ValueError as e:
+            raise TimetableError(f"{where} #{i}: {e}")
+        classes.append((pair[0], pair[1]))
+    return tuple(classes)
+
+def load_timetable(path):
+    """Parse, validate and compile one timetable file; raises TimetableError"""
+    season = os.path.splitext(os.path.basename(path))[0]
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+    except (OSError, ValueError) as e:
+        raise TimetableError(f"can't read it: {e}")
+
+    if not isinstance(raw, dict) or not isinstance(raw.get("days"), dict):
+        raise TimetableError('expected an object with a "days" object')
+    version = raw.get("version", 0)
+    if not isinstance(version, int):
+        raise TimetableError('"version" must be a whole number')
+    room = raw.get("room")
+    if room is not None and not isinstance(room, str):
+        raise TimetableError('"room" must be a string')
+
+    routine = {}
+    for weekday, day in raw["days"].items():
+        if weekday not in WEEKDAYS:
+            raise TimetableError(f"unknown day '{weekday}'")
+        if not isinstance(day, dict):
+            raise TimetableError(f"{weekday}: expected an object with theory and practical")
+        practical = day.get("practical", {})
+        if not isinstance(practical, dict):
+            raise TimetableError(f"{weekday} practical: expected {{group: [[time, subject], ...]}}")
+        routine[weekday] = {
+            "theory": _classes(day.get("theory", []), f"{weekday} theory"),
+            "practical": {
+                group: _classes(classes, f"{weekday} practical {group}")
+                for group, classes in practical.items()
+            },
+        }
+
+    days = {weekday: compile_day(routine_data) for weekday, routine_data in routine.items()}
+    warnings = [
+        f'{weekday}: "{a.time} {a.subject}" overlaps "{b.time} {b.subject}"'
+        + (f" (Group {b.group or a.group})" if a.group or b.group else "")
+        for weekday, day_index in days.items()
+        for a, b in find_overlaps(day_index)
+    ]
+    return Timetable(season, version, room, routine, days, tuple(warnings), path, mtime)
+
+def timetable_files(directory):
+    """{path: mtime} of the *.json files in a directory, the cheap check for changes"""
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return {}
+    files = {}
+    for name in names:
+        if name.endswith(".json"):
+            path = os.path.join(directory, name)
+            try:
+                files[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                pass
+    return files